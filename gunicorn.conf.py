@@ -0,0 +1,37 @@
+"""Настройки gunicorn.
+
+Метрики воркеров собираются в каталоге PROMETHEUS_MULTIPROC_DIR (см.
+yatube/metrics.py): он очищается при старте, а файлы завершившихся
+воркеров помечаются, чтобы их gauge не учитывались в /metrics.
+"""
+import multiprocessing
+import os
+import shutil
+
+bind = '0.0.0.0:8000'
+workers = int(os.environ.get('GUNICORN_WORKERS',
+                             multiprocessing.cpu_count() * 2 + 1))
+# Потоковые воркеры: медленный запрос к базе или медленный клиент
+# занимает один поток, а не весь процесс. GUNICORN_WORKER_CLASS=sync
+# возвращает прежнюю модель, например для сравнения командой loadtest.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+
+def on_starting(server):
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+
+def post_worker_init(worker):
+    from yatube.metrics import WORKERS
+    WORKERS.set(1)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    from yatube.metrics import WORKER_EXITS
+    multiprocess.mark_process_dead(worker.pid)
+    WORKER_EXITS.inc()
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'task', 'status', 'attempts', 'run_at')
+    search_fields = ('task', 'error')
+    list_filter = ('status', 'task')
+    date_hierarchy = 'run_at'
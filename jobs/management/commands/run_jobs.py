@@ -0,0 +1,34 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from prometheus_client import start_http_server
+
+from jobs.queue import work
+from yatube.metrics import registry
+
+
+class Command(BaseCommand):
+    help = ('Выполняет фоновые задачи из очереди в базе; останавливается '
+            'по SIGTERM или SIGINT, дождавшись начатых задач')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int,
+                            default=settings.JOBS_CONCURRENCY,
+                            help='Сколько задач выполнять одновременно')
+        parser.add_argument('--once', action='store_true',
+                            help='Завершиться, когда очередь опустеет')
+        parser.add_argument('--metrics-port', type=int,
+                            help='Отдавать метрики Prometheus воркера '
+                                 'на этом порту')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stop.set())
+        if options['metrics_port']:
+            start_http_server(options['metrics_port'], registry=registry())
+        done = work(concurrency=options['concurrency'],
+                    once=options['once'], stop=stop)
+        self.stdout.write(f'Выполнено задач: {done}')
@@ -0,0 +1,193 @@
+"""Очередь фоновых задач в основной базе данных.
+
+Функция-задача объявляется декоратором @task и ставится в очередь
+методом enqueue(). С settings.JOBS_ASYNC задача записывается строкой
+Job в текущей транзакции: если запись, ради которой её поставили,
+откатится, исчезнет и задача, а воркер увидит её только после
+фиксации. Воркер (команда run_jobs) забирает готовые задачи через
+SELECT ... FOR UPDATE SKIP LOCKED, поэтому несколько воркеров не
+выполняют одну задачу дважды, и выполняет их в ограниченном пуле
+потоков. Упавшая задача повторяется с растущей паузой, после
+max_attempts попыток она остаётся в таблице со статусом failed.
+
+Без JOBS_ASYNC (разработка, тесты) задача выполняется сразу в
+вызывающем процессе, а с after_commit — после фиксации транзакции.
+Исключения задачи в этом режиме только записываются в лог.
+
+Аргументы задачи хранятся в JSON, поэтому передаются id и простые
+значения, а не объекты моделей.
+"""
+import json
+import logging
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from functools import update_wrapper
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from yatube.metrics import JOB_TIME, JOBS_FINISHED
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+class Task:
+    """Функция, которую можно выполнить в фоне."""
+
+    def __init__(self, func, max_attempts=None, after_commit=False):
+        update_wrapper(self, func)
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.max_attempts = max_attempts or settings.JOBS_MAX_ATTEMPTS
+        self.after_commit = after_commit
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def __repr__(self):
+        return f'<Task {self.name}>'
+
+    def enqueue(self, *args, **kwargs):
+        """Поставить задачу в очередь в текущей транзакции."""
+        if settings.JOBS_ASYNC:
+            return Job.objects.create(
+                task=self.name, arguments=json.dumps([args, kwargs]),
+                max_attempts=self.max_attempts)
+
+        def run():
+            try:
+                _run(self, args, kwargs)
+            except Exception:
+                logger.exception('Task %s failed', self.name)
+
+        if self.after_commit:
+            transaction.on_commit(run)
+        else:
+            run()
+        return None
+
+
+def task(max_attempts=None, after_commit=False):
+    """Объявить фоновую задачу.
+
+    after_commit нужен задачам, которые читают данные через другое
+    соединение (например, запрашивают страницу у nginx): без очереди
+    они выполняются только после фиксации транзакции.
+    """
+    def decorator(func):
+        return Task(func, max_attempts=max_attempts,
+                    after_commit=after_commit)
+    return decorator
+
+
+def _run(task, args, kwargs):
+    started = time.monotonic()
+    try:
+        task.func(*args, **kwargs)
+    except Exception:
+        JOBS_FINISHED.labels(task.name, 'error').inc()
+        raise
+    else:
+        JOBS_FINISHED.labels(task.name, 'done').inc()
+    finally:
+        JOB_TIME.labels(task.name).observe(time.monotonic() - started)
+
+
+def claim(limit):
+    """Забрать до limit готовых задач и пометить их выполняемыми.
+
+    Задачи, которые выполняются дольше JOBS_LEASE_SECONDS, считаются
+    брошенными остановившимся воркером и забираются снова.
+    """
+    now = timezone.now()
+    lost = now - timedelta(seconds=settings.JOBS_LEASE_SECONDS)
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=Job.QUEUED, run_at__lte=now)
+                    | Q(status=Job.RUNNING, started__lt=lost))
+            .order_by('run_at')[:limit])
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=Job.RUNNING, started=now, attempts=F('attempts') + 1)
+    for job in jobs:
+        job.status, job.started = Job.RUNNING, now
+        job.attempts += 1
+    return jobs
+
+
+def execute(job):
+    """Выполнить забранную задачу: удалить после успеха, после ошибки
+    отложить следующую попытку или пометить failed."""
+    try:
+        target = import_string(job.task)
+        args, kwargs = json.loads(job.arguments)
+        if job.attempts > job.max_attempts:
+            raise RuntimeError('Задача не завершилась за отведённое время')
+        _run(target, args, kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Job %s (%s) failed', job.pk, job.task)
+        if job.attempts >= job.max_attempts:
+            Job.objects.filter(pk=job.pk).update(status=Job.FAILED,
+                                                 error=error)
+            JOBS_FINISHED.labels(job.task, 'failed').inc()
+            return False
+        delay = settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.QUEUED, error=error,
+            run_at=timezone.now() + timedelta(seconds=delay))
+        return False
+    Job.objects.filter(pk=job.pk).delete()
+    return True
+
+
+def _execute_in_thread(job):
+    close_old_connections()
+    try:
+        return execute(job)
+    finally:
+        close_old_connections()
+
+
+def work(concurrency=None, once=False, stop=None, poll_interval=None):
+    """Выполнять задачи, пока не установлено событие stop.
+
+    Одновременно выполняется не больше concurrency задач. С once воркер
+    завершается, когда готовых задач не осталось. Возвращает число
+    выполненных задач.
+    """
+    concurrency = concurrency or settings.JOBS_CONCURRENCY
+    poll_interval = (settings.JOBS_POLL_INTERVAL if poll_interval is None
+                     else poll_interval)
+    stop = stop or threading.Event()
+    running = set()
+    done = 0
+    with ThreadPoolExecutor(max_workers=concurrency,
+                            thread_name_prefix='jobs') as executor:
+        while not stop.is_set():
+            jobs = claim(concurrency - len(running))
+            running.update(executor.submit(_execute_in_thread, job)
+                           for job in jobs)
+            if not running:
+                if once:
+                    break
+                stop.wait(poll_interval)
+                continue
+            # Пока есть свободные потоки, очередь опрашивается снова
+            # через poll_interval, даже если ни одна задача не закончилась.
+            full = len(running) >= concurrency
+            finished, running = wait(
+                running, timeout=None if full else poll_interval,
+                return_when=FIRST_COMPLETED)
+            done += sum(future.result() for future in finished)
+        finished, _ = wait(running)
+        done += sum(future.result() for future in finished)
+    return done
@@ -0,0 +1,157 @@
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.db import transaction
+from django.test import (TestCase, TransactionTestCase, override_settings,
+                         skipUnlessDBFeature)
+from django.utils import timezone
+
+from jobs import queue
+from jobs.models import Job
+from jobs.queue import task
+
+calls = []
+_lock = threading.Lock()
+_running = [0, 0]
+
+
+@task()
+def record(value, suffix=''):
+    calls.append(value + suffix)
+
+
+@task(max_attempts=2)
+def explode():
+    raise ValueError('boom')
+
+
+@task()
+def slow():
+    with _lock:
+        _running[0] += 1
+        _running[1] = max(_running)
+    time.sleep(0.05)
+    with _lock:
+        _running[0] -= 1
+
+
+class EagerTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_runs_in_process(self):
+        self.assertIsNone(record.enqueue('now'))
+        self.assertEqual(calls, ['now'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_after_commit(self):
+        callbacks = []
+        after_commit = queue.Task(record.func, after_commit=True)
+        with mock.patch.object(queue.transaction, 'on_commit',
+                               side_effect=callbacks.append):
+            after_commit.enqueue('later')
+        self.assertEqual(calls, [])
+        callbacks[0]()
+        self.assertEqual(calls, ['later'])
+
+    def test_errors_are_logged(self):
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            explode.enqueue()
+
+
+@override_settings(JOBS_ASYNC=True, JOBS_RETRY_DELAY=10)
+class QueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_is_part_of_transaction(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            record.enqueue('lost')
+            raise RuntimeError
+        job = record.enqueue('kept', suffix='!')
+        self.assertEqual(list(Job.objects.all()), [job])
+        self.assertEqual(calls, [])
+
+        [claimed] = queue.claim(10)
+        self.assertEqual((claimed.status, claimed.attempts),
+                         (Job.RUNNING, 1))
+        self.assertEqual(queue.claim(10), [])
+        self.assertTrue(queue.execute(claimed))
+        self.assertEqual(calls, ['kept!'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_retry_then_fail(self):
+        job = explode.enqueue()
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            self.assertFalse(queue.execute(queue.claim(1)[0]))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('boom', job.error)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertEqual(queue.claim(1), [])
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            queue.execute(queue.claim(1)[0])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertEqual(queue.claim(1), [])
+
+    def test_lost_job_is_claimed_again(self):
+        job = record.enqueue('again')
+        queue.claim(1)
+        self.assertEqual(queue.claim(1), [])
+        Job.objects.update(started=timezone.now() - timedelta(hours=1))
+        self.assertEqual(queue.claim(1), [job])
+
+    def test_metrics(self):
+        record.enqueue('metrics')
+        queue.execute(queue.claim(1)[0])
+        record.enqueue('waiting')
+        response = self.client.get('/metrics')
+        self.assertContains(response, 'yatube_jobs{status="queued"} 1.0')
+        self.assertContains(
+            response, 'yatube_jobs_finished_total{result="done",'
+                      'task="jobs.tests.record"}')
+        self.assertContains(response, 'yatube_jobs_lag_seconds')
+
+
+def _execute_slowly(job):
+    slow()
+    return True
+
+
+@override_settings(JOBS_ASYNC=True)
+class WorkerTests(TestCase):
+
+    def test_concurrency_limit(self):
+        _running[:] = [0, 0]
+        for _ in range(6):
+            slow.enqueue()
+        with mock.patch.object(queue, 'execute', _execute_slowly):
+            self.assertEqual(queue.work(concurrency=2, once=True,
+                                        poll_interval=0.01), 6)
+        self.assertEqual(_running[1], 2)
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+@override_settings(JOBS_ASYNC=True)
+class ThreadedWorkerTests(TransactionTestCase):
+    """Воркер выполняет задачи в потоках со своими соединениями.
+
+    В SQLite потоки тестовой базы в памяти блокируют друг другу таблицы,
+    поэтому тест выполняется только в PostgreSQL.
+    """
+
+    def test_all_jobs_are_done(self):
+        calls.clear()
+        for number in range(6):
+            record.enqueue(str(number))
+        self.assertEqual(queue.work(concurrency=3, once=True,
+                                    poll_interval=0.01), 6)
+        self.assertEqual(sorted(calls), [str(number) for number in range(6)])
+        self.assertFalse(Job.objects.exists())
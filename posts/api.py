@@ -0,0 +1,213 @@
+"""JSON API только для чтения, версия 1 (адреса /api/v1/...).
+
+Адреса повторяют адреса страниц из posts.urls: лента, группа, профиль,
+пост и его комментарии. Списки разбиваются на страницы курсором
+(cursor, limit), параметр fields=id,text,author оставляет в ответе
+только перечисленные поля. Строки читаются через values() одним
+запросом вместе с автором и группой, без создания моделей и без
+шаблонов, и из базы выбираются только столбцы запрошенных полей.
+ETag берётся из тех же валидаторов, что и у страниц.
+"""
+from functools import wraps
+from operator import itemgetter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.urls import path
+from django.views.decorators.http import require_safe
+
+from .conditional import (conditional_page, group_state, index_state,
+                          post_state, profile_state)
+from .models import Comment, Group, Post
+from .pagination import CursorPaginator
+
+User = get_user_model()
+
+app_name = 'api'
+
+AUTHOR_COLUMNS = ('username', 'first_name', 'last_name')
+COUNTER_COLUMNS = ('followers_count', 'following_count', 'posts_count')
+
+
+class InvalidParameter(ValueError):
+    """Параметр запроса, на который API отвечает 400."""
+
+
+def _column(name):
+    return (name,), itemgetter(name)
+
+
+def _embedded(prefix, names):
+    """Вложенный объект из столбцов связанной модели, None без связи."""
+    columns = tuple(prefix + name for name in names)
+
+    def build(row):
+        if row[columns[0]] is None:
+            return None
+        return {name: row[column] for name, column in zip(names, columns)}
+    return columns, build
+
+
+def _image(row):
+    if not row['image']:
+        return None
+    return {'url': default_storage.url(row['image']),
+            'width': row['image_width'], 'height': row['image_height']}
+
+
+# Поле ответа -> (столбцы values(), построение значения из строки).
+POST_FIELDS = {
+    'id': _column('pk'),
+    'text': _column('text'),
+    'pub_date': _column('pub_date'),
+    'updated': _column('updated'),
+    'comment_count': _column('comment_count'),
+    'image': (('image', 'image_width', 'image_height'), _image),
+    'author': _embedded('author__', AUTHOR_COLUMNS),
+    'group': _embedded('group__', ('slug', 'title')),
+}
+
+COMMENT_FIELDS = {
+    'id': _column('pk'),
+    'post': _column('post_id'),
+    'text': _column('text'),
+    'created': _column('created'),
+    'updated': _column('updated'),
+    'author': _embedded('author__', AUTHOR_COLUMNS),
+}
+
+
+def _response(data, status=200):
+    return JsonResponse(data, status=status,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def _not_found():
+    return _response({'detail': 'Не найдено'}, status=404)
+
+
+def api_view(validators):
+    """GET и HEAD с условными ответами; ошибки параметров — 400."""
+    def decorator(view):
+        @require_safe
+        @conditional_page(validators)
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                return view(request, *args, **kwargs)
+            except InvalidParameter as error:
+                return _response({'detail': str(error)}, status=400)
+        return wrapper
+    return decorator
+
+
+def _field_names(request, spec):
+    value = request.GET.get('fields')
+    if not value:
+        return list(spec)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in spec]
+    if unknown or not names:
+        raise InvalidParameter(
+            f'Неизвестные поля: {", ".join(unknown)}. '
+            f'Доступны: {", ".join(spec)}')
+    return names
+
+
+def _limit(request):
+    value = request.GET.get('limit')
+    if value is None:
+        return settings.API_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise InvalidParameter('limit должен быть целым числом')
+    return max(1, min(limit, settings.API_MAX_PAGE_SIZE))
+
+
+def _values(queryset, spec, names, *key):
+    """values() только со столбцами запрошенных полей и ключа."""
+    columns = dict.fromkeys(key)
+    for name in names:
+        columns.update(dict.fromkeys(spec[name][0]))
+    return queryset.values(*columns)
+
+
+def _serialize(row, spec, names):
+    return {name: spec[name][1](row) for name in names}
+
+
+def _list(request, queryset, spec, field='pub_date'):
+    """Страница списка по курсору в ответе API."""
+    names = _field_names(request, spec)
+    paginator = CursorPaginator(_values(queryset, spec, names, 'pk', field),
+                                _limit(request), field=field)
+    page = paginator.get_page(request.GET.get('cursor'))
+    return {
+        'results': [_serialize(row, spec, names) for row in page],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    }
+
+
+@api_view(index_state)
+def index(request):
+    return _response(_list(request, Post.objects.all(), POST_FIELDS))
+
+
+@api_view(group_state)
+def group_posts(request, slug):
+    group = Group.objects.filter(slug=slug).values(
+        'pk', 'slug', 'title', 'description').first()
+    if group is None:
+        return _not_found()
+    posts = _list(request, Post.objects.filter(group=group.pop('pk')),
+                  POST_FIELDS)
+    return _response({'group': group, **posts})
+
+
+@api_view(profile_state)
+def profile_view(request, username):
+    author = User.objects.filter(username=username).values(
+        'pk', *AUTHOR_COLUMNS,
+        *(f'profile__{column}' for column in COUNTER_COLUMNS)).first()
+    if author is None:
+        return _not_found()
+    posts = _list(request, Post.objects.filter(author=author['pk']),
+                  POST_FIELDS)
+    profile = {column: author[column] for column in AUTHOR_COLUMNS}
+    profile.update((column, author[f'profile__{column}'] or 0)
+                   for column in COUNTER_COLUMNS)
+    return _response({'author': profile, **posts})
+
+
+@api_view(post_state)
+def post_view(request, username, post_id):
+    names = _field_names(request, POST_FIELDS)
+    post = _values(Post.objects.filter(pk=post_id,
+                                       author__username=username),
+                   POST_FIELDS, names).first()
+    if post is None:
+        return _not_found()
+    return _response(_serialize(post, POST_FIELDS, names))
+
+
+@api_view(post_state)
+def post_comments(request, username, post_id):
+    if not Post.objects.filter(pk=post_id,
+                               author__username=username).exists():
+        return _not_found()
+    return _response(_list(request, Comment.objects.filter(post=post_id),
+                           COMMENT_FIELDS, field='created'))
+
+
+urlpatterns = [
+    path('', index, name='index'),
+    path('group/<slug:slug>/', group_posts, name='group_posts'),
+    path('<str:username>/', profile_view, name='profile'),
+    path('<str:username>/<int:post_id>/', post_view, name='post'),
+    path('<str:username>/<int:post_id>/comments/', post_comments,
+         name='post_comments'),
+]
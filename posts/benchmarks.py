@@ -0,0 +1,455 @@
+"""Нагрузочные замеры представлений posts.
+
+generate() наполняет базу синтетическими данными реалистичного объёма:
+пользователи, группы, посты с датами за последний год, подписки, у
+которых число подписчиков автора распределено по степенному закону,
+и комментарии, больше всего — к постам популярных авторов.
+
+load_test() нагружает уже запущенный сервер по HTTP: быстрые клиенты
+в цикле запрашивают страницы, а медленные держат соединения, по байту
+отправляя запрос. Так сравнивается пропускная способность разных
+моделей воркеров gunicorn (sync и gthread) при множестве медленных
+клиентов.
+
+run() прогоняет каждый сценарий через тестовый клиент и для каждого
+собирает число запросов к базе, время в базе, время рендеринга
+шаблона и задержку (p50, p99). Пишущие сценарии выполняются внутри
+транзакции, которая откатывается, так что данные не меняются между
+прогонами. Отчёт сохраняется в JSON и сравнивается с сохранённым
+ранее (базовой линией).
+
+render_feed() замеряет только рендеринг страницы ленты: карточки через
+{% include %}, через тег {% post_card %} в цикле и через {% post_cards %},
+с кеширующим загрузчиком шаблонов и без него, с пустым и заполненным
+кешем фрагментов.
+"""
+import bisect
+import http.client
+import itertools
+import random
+import socket
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count
+from django.template import Context, Engine, engines
+from django.template.backends.django import Template
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .bulk import explicit_dates
+from .feeds import feed_queryset
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+WORDS = ('лето', 'город', 'кофе', 'поезд', 'море', 'книга', 'утро', 'кот',
+         'дорога', 'музыка', 'дождь', 'горы', 'друзья', 'вечер', 'работа',
+         'фото', 'осень', 'сад', 'река', 'снег', 'код', 'django', 'python')
+
+
+def _text(rng, words):
+    return ' '.join(rng.choices(WORDS, k=words)).capitalize() + '.'
+
+
+def _zipf_weights(count, exponent):
+    """Накопленные веса распределения Ципфа для count элементов."""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def _pick(rng, items, cum_weights):
+    return items[bisect.bisect(cum_weights, rng.random() * cum_weights[-1])]
+
+
+def _bulk_create(model, objects, batch_size):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) == batch_size:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+def _ids(model):
+    return list(model.objects.order_by('pk').values_list('pk', flat=True))
+
+
+def generate(users=100000, posts=1000000, groups=50, comments=2000000,
+             follows_per_user=20, exponent=1.1, seed=0, batch_size=5000,
+             log=print):
+    """Наполнить базу синтетическими данными.
+
+    Популярность авторов распределена по Ципфу с показателем exponent:
+    этим распределением выбираются и авторы постов, и авторы, на
+    которых подписываются, и посты для комментариев.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    password = make_password('benchmark')
+    first_user, first_group = User.objects.count(), Group.objects.count()
+
+    _bulk_create(User, (
+        User(username=f'bench{first_user + number}', password=password)
+        for number in range(users)), batch_size)
+    user_ids = _ids(User)
+    log(f'Пользователей: {len(user_ids)}')
+
+    _bulk_create(Group, (
+        Group(title=f'Группа {number}', slug=f'bench-{number}',
+              description=_text(rng, 12))
+        for number in range(first_group, first_group + groups)), batch_size)
+    group_ids = _ids(Group)
+
+    popularity = user_ids[:]
+    rng.shuffle(popularity)
+    author_weights = _zipf_weights(len(popularity), exponent)
+    group_weights = _zipf_weights(len(group_ids), exponent)
+
+    def new_posts():
+        for _ in range(posts):
+            pub_date = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+            yield Post(
+                text=_text(rng, rng.randint(5, 60)),
+                author_id=_pick(rng, popularity, author_weights),
+                group_id=(_pick(rng, group_ids, group_weights)
+                          if group_ids and rng.random() < 0.6 else None),
+                pub_date=pub_date, updated=pub_date,
+            )
+
+    with explicit_dates(Post._meta.get_field('pub_date'),
+                        Post._meta.get_field('updated')):
+        _bulk_create(Post, new_posts(), batch_size)
+    log(f'Постов: {Post.objects.count()}')
+
+    def new_follows():
+        for user_id in user_ids:
+            authors = {_pick(rng, popularity, author_weights)
+                       for _ in range(rng.randint(0, 2 * follows_per_user))}
+            authors.discard(user_id)
+            for author_id in authors:
+                yield Follow(user_id=user_id, author_id=author_id)
+
+    _bulk_create(Follow, new_follows(), batch_size)
+    log(f'Подписок: {Follow.objects.count()}')
+
+    # Чаще комментируют посты популярных авторов.
+    post_ids = []
+    for author_id in popularity[:1000]:
+        post_ids += Post.objects.filter(author_id=author_id).values_list(
+            'pk', flat=True)[:200]
+    post_weights = _zipf_weights(len(post_ids), exponent / 2)
+    all_post_ids = _ids(Post)
+
+    def new_comments():
+        for _ in range(comments):
+            if post_ids and rng.random() < 0.8:
+                post_id = _pick(rng, post_ids, post_weights)
+            else:
+                post_id = rng.choice(all_post_ids)
+            created = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+            yield Comment(
+                post_id=post_id,
+                author_id=rng.choice(user_ids),
+                text=_text(rng, rng.randint(3, 25)),
+                created=created, updated=created,
+            )
+
+    if all_post_ids:
+        with explicit_dates(Comment._meta.get_field('created'),
+                            Comment._meta.get_field('updated')):
+            _bulk_create(Comment, new_comments(), batch_size)
+    log(f'Комментариев: {Comment.objects.count()}')
+
+
+@contextmanager
+def _render_timer(timings):
+    """Накопить в timings время рендеринга шаблонов представлений.
+
+    Сюда входят и запросы, которые шаблон выполняет при обходе
+    ленивых QuerySet.
+    """
+    original = Template.render
+
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            timings.append(time.perf_counter() - start)
+
+    Template.render = render
+    try:
+        yield
+    finally:
+        Template.render = original
+
+
+class Scenario:
+    """Один замеряемый запрос.
+
+    request — функция (client, iteration), выполняющая запрос;
+    user — пользователь, от имени которого он выполняется;
+    write — сценарий меняет данные и откатывается после каждого раза.
+    """
+
+    def __init__(self, name, request, user=None, write=False):
+        self.name = name
+        self.request = request
+        self.user = user
+        self.write = write
+
+
+def default_scenarios():
+    """Сценарии для всех представлений posts на текущих данных."""
+    reader = (User.objects.annotate(total=Count('follower'))
+              .order_by('-total').first())
+    author = (User.objects.annotate(total=Count('following'))
+              .order_by('-total').first())
+    group = (Group.objects.annotate(total=Count('group_posts'))
+             .order_by('-total').first())
+    post = Post.objects.filter(author=author).order_by(
+        '-comment_count').first()
+    if None in (reader, author, group, post):
+        raise ValueError('Для замеров нужны пользователи, группа и посты')
+    other = User.objects.exclude(pk=author.pk).exclude(
+        follower__author=author).first()
+    post_url = reverse('post', args=[author.username, post.pk])
+
+    def get(url):
+        return lambda client, iteration: client.get(url)
+
+    def follow(client, iteration):
+        client.get(reverse('profile_follow', args=[author.username]))
+        client.get(reverse('profile_unfollow', args=[author.username]))
+
+    scenarios = [
+        Scenario('index', get(reverse('index'))),
+        Scenario('index_page_50', get(reverse('index') + '?page=50')),
+        Scenario('group_posts',
+                 get(reverse('group_posts', args=[group.slug]))),
+        Scenario('profile_view',
+                 get(reverse('profile', args=[author.username]))),
+        Scenario('post_view', get(post_url)),
+        Scenario('follow_index', get(reverse('follow_index')), user=reader),
+        Scenario('new_post', lambda client, iteration: client.post(
+            reverse('new_post'),
+            {'text': f'Замер {iteration}', 'group': group.pk}),
+            user=author, write=True),
+        Scenario('post_edit', lambda client, iteration: client.post(
+            reverse('post_edit', args=[author.username, post.pk]),
+            {'text': f'Правка {iteration}', 'group': group.pk}),
+            user=author, write=True),
+        Scenario('add_comment', lambda client, iteration: client.post(
+            reverse('add_comment', args=[author.username, post.pk]),
+            {'text': f'Комментарий {iteration}'}),
+            user=reader, write=True),
+    ]
+    if other is not None:
+        scenarios.append(
+            Scenario('follow_unfollow', follow, user=other, write=True))
+    return scenarios
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(percent / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def _measure(scenario, client, iteration):
+    render_times = []
+    with CaptureQueriesContext(connection) as queries, \
+            _render_timer(render_times):
+        start = time.perf_counter()
+        if scenario.write:
+            with transaction.atomic():
+                scenario.request(client, iteration)
+                transaction.set_rollback(True)
+        else:
+            scenario.request(client, iteration)
+        elapsed = time.perf_counter() - start
+    db_time = sum(float(query['time']) for query in queries.captured_queries)
+    return elapsed, len(queries), db_time, sum(render_times)
+
+
+def run(scenarios, iterations=50, warmup=5, cold=False):
+    """Замерить сценарии и вернуть отчёт: имя -> метрики в мс."""
+    report = {}
+    for scenario in scenarios:
+        client = Client()
+        if scenario.user is not None:
+            client.force_login(scenario.user)
+        samples = []
+        for iteration in range(warmup + iterations):
+            if cold:
+                cache.clear()
+            sample = _measure(scenario, client, iteration)
+            if iteration >= warmup:
+                samples.append(sample)
+        latencies, query_counts, db_times, render_times = zip(*samples)
+        report[scenario.name] = {
+            'p50_ms': _percentile(latencies, 50) * 1000,
+            'p99_ms': _percentile(latencies, 99) * 1000,
+            'queries': statistics.median(query_counts),
+            'db_ms': statistics.median(db_times) * 1000,
+            'render_ms': statistics.median(render_times) * 1000,
+        }
+    return report
+
+
+FEED_TEMPLATES = {
+    'include': ('{% for post in posts %}{% include "post_item.html" %}'
+                '{% endfor %}'),
+    'post_card': ('{% load post_filters %}{% for post in posts %}'
+                  '{% post_card post %}{% endfor %}'),
+    'post_cards': '{% load post_filters %}{% post_cards posts %}',
+}
+
+
+def _template_engine(cached):
+    loaders = ['django.template.loaders.filesystem.Loader',
+               'django.template.loaders.app_directories.Loader']
+    if cached:
+        loaders = [('django.template.loaders.cached.Loader', loaders)]
+    engine = engines['django'].engine
+    return Engine(dirs=engine.dirs, loaders=loaders,
+                  libraries=engine.libraries)
+
+
+def render_feed(iterations=50, per_page=10):
+    """Замерить рендеринг страницы ленты из per_page постов.
+
+    Возвращает отчёт: вариант -> медиана в мс с пустым (cold_ms) и
+    заполненным (warm_ms) кешем фрагментов.
+    """
+    posts = list(feed_queryset()[:per_page])
+    if not posts:
+        raise ValueError('Для замеров нужны посты')
+    report = {}
+    for loader in ('plain', 'cached'):
+        engine = _template_engine(cached=loader == 'cached')
+        for name, source in FEED_TEMPLATES.items():
+            template = engine.from_string(source)
+            timings = {'cold': [], 'warm': []}
+            for iteration in range(iterations):
+                for mode in ('cold', 'warm'):
+                    if mode == 'cold':
+                        cache.clear()
+                    start = time.perf_counter()
+                    template.render(Context({'posts': posts,
+                                             'user': AnonymousUser()}))
+                    timings[mode].append(time.perf_counter() - start)
+            report[f'{name}/{loader}'] = {
+                f'{mode}_ms': statistics.median(values) * 1000
+                for mode, values in timings.items()}
+    return report
+
+
+def compare(report, baseline, threshold=0.2):
+    """Сравнить отчёт с базовой линией.
+
+    Возвращает строки сравнения и список сценариев, у которых p50 или
+    число запросов выросли больше чем на долю threshold.
+    """
+    lines, regressions = [], []
+    for name, metrics in report.items():
+        base = baseline.get(name)
+        if base is None:
+            lines.append(f'{name}: нет в базовой линии')
+            continue
+        changes = []
+        for key in ('p50_ms', 'p99_ms', 'queries', 'db_ms', 'render_ms'):
+            before, after = base[key], metrics[key]
+            delta = (after - before) / before if before else 0
+            changes.append(f'{key} {before:.1f} -> {after:.1f} '
+                           f'({delta:+.0%})')
+            if key in ('p50_ms', 'queries') and delta > threshold:
+                regressions.append(name)
+        lines.append(f'{name}: ' + ', '.join(changes))
+    return lines, sorted(set(regressions))
+
+
+def _slow_client(host, port, path, delay, stop):
+    """Держать соединение, отправляя запрос по байту раз в delay секунд."""
+    request = (f'GET {path} HTTP/1.1\r\nHost: {host}\r\n'
+               f'User-Agent: slow-client\r\n\r\n').encode()
+    while not stop.is_set():
+        try:
+            with socket.create_connection((host, port), timeout=10) as sock:
+                for byte in request:
+                    if stop.wait(delay):
+                        return
+                    sock.sendall(bytes([byte]))
+                while sock.recv(1024) and not stop.wait(delay):
+                    pass
+        except OSError:
+            if stop.wait(delay):
+                return
+
+
+def _fast_client(host, port, paths, stop, latencies, errors):
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    for path in itertools.cycle(paths):
+        if stop.is_set():
+            break
+        start = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(response.status)
+            else:
+                latencies.append(time.perf_counter() - start)
+        except (OSError, http.client.HTTPException) as error:
+            errors.append(type(error).__name__)
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=30)
+    connection.close()
+
+
+def load_test(base_url, paths=('/',), clients=10, slow_clients=0,
+              slow_delay=1.0, duration=10.0):
+    """Нагрузить сервер base_url и вернуть пропускную способность и
+    задержки быстрых клиентов."""
+    parts = urlsplit(base_url)
+    host, port = parts.hostname, parts.port or 80
+    paths = [parts.path.rstrip('/') + path for path in paths]
+    stop = threading.Event()
+    latencies, errors = [], []
+    threads = [
+        threading.Thread(target=_slow_client, daemon=True,
+                         args=(host, port, paths[0], slow_delay, stop))
+        for _ in range(slow_clients)
+    ] + [
+        threading.Thread(target=_fast_client, daemon=True,
+                         args=(host, port, paths, stop, latencies, errors))
+        for _ in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=30)
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput_rps': len(latencies) / duration,
+        'p50_ms': (_percentile(latencies, 50) * 1000 if latencies else None),
+        'p99_ms': (_percentile(latencies, 99) * 1000 if latencies else None),
+    }
@@ -0,0 +1,192 @@
+"""Потоковые выгрузка и загрузка данных в NDJSON и CSV.
+
+Каждая таблица выгружается в отдельный файл: одна строка — одна запись
+с первичным ключом и ссылками на связанные записи (author_id, group_id
+и т. д.), поэтому загружать файлы нужно в порядке MODELS. Выгрузка
+читает таблицу пачками по ключу, загрузка — цепочка генераторов
+(строки файла -> записи -> объекты -> пачки), так что память не растёт
+с размером файла. Пачка сохраняется одним bulk_create в своей
+транзакции; записи с уже занятым ключом или уникальным значением
+пропускаются. После сбоя загрузку можно продолжить с номера записи
+из последнего сообщения о прогрессе.
+
+Производные данные (счётчики, поисковый индекс, миниатюры) не
+выгружаются: после загрузки их пересчитывают reconcile_counters
+и rebuild_search_index.
+"""
+import csv
+import gzip
+import itertools
+import json
+import sys
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import DatabaseError, connection, transaction
+
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+FORMATS = (NDJSON, CSV)
+
+
+class BulkImportError(Exception):
+    """Загрузка прервалась; position — сколько записей файла уже
+    сохранено, с этого номера её можно продолжить."""
+
+    def __init__(self, position, error):
+        super().__init__(f'{error} (после записи {position})')
+        self.position = position
+
+
+# Имя набора -> (модель, столбцы). Порядок — порядок загрузки.
+MODELS = {
+    'users': (User, ('id', 'username', 'password', 'first_name',
+                     'last_name', 'email', 'is_active', 'date_joined')),
+    'groups': (Group, ('id', 'title', 'slug', 'description')),
+    'posts': (Post, ('id', 'text', 'pub_date', 'updated', 'author_id',
+                     'group_id', 'image')),
+    'comments': (Comment, ('id', 'post_id', 'author_id', 'text', 'created',
+                           'updated')),
+    'follows': (Follow, ('id', 'user_id', 'author_id')),
+}
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Отключить auto_now и auto_now_add, чтобы bulk_create сохранил
+    заданные даты."""
+    flags = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in flags:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def guess_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    return CSV if name.endswith('.csv') else NDJSON
+
+
+@contextmanager
+def open_file(path, mode):
+    """Открыть файл в текстовом режиме; .gz сжимается на лету, '-' —
+    стандартный ввод или вывод."""
+    if path == '-':
+        yield sys.stdin if mode == 'r' else sys.stdout
+        return
+    if path.endswith('.gz'):
+        file = gzip.open(path, mode + 't', encoding='utf-8', newline='')
+    else:
+        file = open(path, mode, encoding='utf-8', newline='')
+    with file:
+        yield file
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _dump(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def export_rows(name, batch_size=5000):
+    """Записи набора name словарями столбец -> значение, по порядку pk."""
+    model, columns = MODELS[name]
+    rows = model.objects.order_by('pk').values_list(*columns)
+    last_id = 0
+    while True:
+        batch = list(rows.filter(pk__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        for row in batch:
+            yield {column: _dump(value)
+                   for column, value in zip(columns, row)}
+        last_id = batch[-1][0]
+
+
+def write_rows(rows, file, fmt, columns):
+    if fmt == CSV:
+        writer = csv.DictWriter(file, columns, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+        return
+    for row in rows:
+        file.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+
+def read_rows(file, fmt, offset=0):
+    """Записи файла словарями; первые offset записей пропускаются."""
+    if fmt == CSV:
+        return itertools.islice(csv.DictReader(file), offset, None)
+    lines = itertools.islice((line for line in file if line.strip()),
+                             offset, None)
+    return (json.loads(line) for line in lines)
+
+
+def _converters(model, columns):
+    converters = {}
+    for column in columns:
+        field = model._meta.get_field(column)
+
+        def convert(value, field=field):
+            # В CSV пустая строка означает NULL.
+            if value in ('', None) and field.null:
+                return None
+            return field.to_python(value)
+        converters[column] = convert
+    return converters
+
+
+def _objects(model, columns, rows):
+    converters = _converters(model, columns)
+    for row in rows:
+        yield model(**{column: converters[column](row[column])
+                       for column in columns if column in row})
+
+
+def _reset_sequence(model):
+    """Сдвинуть последовательность ключей за загруженные id (PostgreSQL)."""
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def import_rows(name, rows, batch_size=5000, offset=0, log=print):
+    """Загрузить записи набора name пачками и вернуть номер последней
+    обработанной записи файла (с учётом пропущенных offset)."""
+    model, columns = MODELS[name]
+    date_fields = [field for field in model._meta.concrete_fields
+                   if getattr(field, 'auto_now', False)
+                   or getattr(field, 'auto_now_add', False)]
+    position = offset
+    try:
+        with explicit_dates(*date_fields):
+            for batch in _batches(_objects(model, columns, rows),
+                                  batch_size):
+                with transaction.atomic():
+                    model.objects.bulk_create(batch, ignore_conflicts=True)
+                position += len(batch)
+                log(f'{name}: {position}')
+    except (ValueError, ValidationError, DatabaseError) as error:
+        raise BulkImportError(position, error) from error
+    _reset_sequence(model)
+    return position
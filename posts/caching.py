@@ -0,0 +1,125 @@
+"""Версии для ключей кеша фрагментов.
+
+Каждая лента кешируется в шаблоне тегом {% cache %}, а карточки
+постов — тегами {% post_card %} и {% post_cards %}; в ключ фрагмента
+входит версия. Версия — случайный токен в кеше; чтобы сбросить
+фрагменты, достаточно заменить токен, старые записи просто истекут
+по таймауту.
+
+Имена версий:
+    feed:index              — главная лента;
+    feed:group:<id>         — лента группы;
+    feed:profile:<id>       — лента автора;
+    feed:follow             — общая часть ключа всех лент подписок;
+    feed:follow:<user_id>   — лента подписок пользователя;
+    feed:popular            — лента популярного;
+    post:<id>               — карточка поста.
+
+Если чтение идёт с реплик, фрагмент может успеть закешироваться под
+новой версией по данным отстающей реплики. Поэтому при включённых
+репликах версии сбрасываются ещё раз через settings.REPLICA_MAX_LAG
+секунд; повторные сбросы за это время объединяются.
+"""
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Follow
+
+
+def _key(name):
+    return f'version:{name}'
+
+
+def _token():
+    return uuid.uuid4().hex
+
+
+def _tokens(keys):
+    tokens = cache.get_many(keys)
+    for key in keys:
+        if key not in tokens:
+            token = _token()
+            cache.add(key, token, None)
+            # Без кеша (недоступен, ключ вытеснен) токен не прочитать:
+            # страница строится с новой версией, как при промахе.
+            tokens[key] = cache.get(key) or token
+    return tokens
+
+
+def version(*names):
+    """Текущая версия для набора имён одной строкой."""
+    keys = [_key(name) for name in names]
+    tokens = _tokens(keys)
+    return '.'.join(tokens[key] for key in keys)
+
+
+def versions(names):
+    """Текущие версии нескольких имён одним запросом к кешу:
+    имя -> версия."""
+    tokens = _tokens([_key(name) for name in names])
+    return {name: tokens[_key(name)] for name in names}
+
+
+_pending = set()
+_pending_lock = threading.Lock()
+_timer = None
+
+
+def _set_new_tokens(names):
+    cache.set_many({_key(name): _token() for name in names}, None)
+
+
+def _flush_pending():
+    global _timer
+    with _pending_lock:
+        names = list(_pending)
+        _pending.clear()
+        _timer = None
+    _set_new_tokens(names)
+
+
+def _invalidate_later(names):
+    global _timer
+    with _pending_lock:
+        _pending.update(names)
+        if _timer is None:
+            _timer = threading.Timer(settings.REPLICA_MAX_LAG,
+                                     _flush_pending)
+            _timer.daemon = True
+            _timer.start()
+
+
+def invalidate(*names):
+    """Сменить версии, сбросив все зависящие от них фрагменты."""
+    _set_new_tokens(names)
+    if settings.DATABASE_REPLICAS:
+        _invalidate_later(names)
+
+
+def follow_feed_version(user_id):
+    return version('feed:follow', f'feed:follow:{user_id}')
+
+
+def invalidate_post(post, group_ids=()):
+    """Сбросить карточку поста и все ленты, где он показывается.
+
+    group_ids — дополнительные группы, например прежняя группа
+    отредактированного поста. Ленты подписок сбрасываются для каждого
+    подписчика, а у авторов с очень большим числом подписчиков —
+    все разом, чтобы не перебирать их.
+    """
+    names = [f'post:{post.pk}', 'feed:index', 'feed:popular',
+             f'feed:profile:{post.author_id}']
+    names += [f'feed:group:{group_id}'
+              for group_id in {post.group_id, *group_ids} if group_id]
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    follower_ids = list(Follow.objects.filter(author=post.author_id)
+                        .values_list('user_id', flat=True)[:limit + 1])
+    if len(follower_ids) > limit:
+        names.append('feed:follow')
+    else:
+        names += [f'feed:follow:{user_id}' for user_id in follower_ids]
+    invalidate(*names)
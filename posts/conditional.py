@@ -0,0 +1,120 @@
+"""Условные ответы: ETag и Last-Modified для лент и страниц постов.
+
+Валидатор страницы собирается без рендеринга из того, что дёшево
+узнать: версий фрагментов из posts.caching (они меняются при любом
+изменении постов, комментариев и подписок, в том числе при удалении),
+полей updated и счётчиков профиля. К ним добавляется всё, от чего
+страница зависит для конкретного посетителя: адрес с параметрами,
+пользователь, ещё не показанные сообщения и cookie CSRF, из которой
+берётся токен форм.
+
+Если клиент прислал совпадающий If-None-Match, представление не
+вызывается и клиент получает 304. Last-Modified страницы не отдают:
+удаление поста не оставляет в ленте даты, а страница поста показывает
+счётчики профиля автора и подписку посетителя, у которых нет времени
+изменения, и по одному If-Modified-Since клиент получил бы их старыми.
+"""
+import hashlib
+from calendar import timegm
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
+from django.db.models import Exists, Max, OuterRef
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from . import caching
+from .models import Follow, Group, Post
+
+User = get_user_model()
+
+PROFILE_FIELDS = ('first_name', 'last_name', 'profile__followers_count',
+                  'profile__following_count', 'profile__posts_count')
+
+
+def _etag(request, parts):
+    viewer = (request.get_full_path(), request.user.pk,
+              len(get_messages(request)), request.META.get('CSRF_COOKIE'))
+    digest = hashlib.md5(repr((viewer, parts)).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def conditional_page(validators):
+    """Отвечать 304 на GET и HEAD, если страница не изменилась.
+
+    validators(request, *args, **kwargs) возвращает пару (данные для
+    ETag, Last-Modified или None) либо None, если объекта страницы нет —
+    тогда представление вызывается как обычно.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            state = validators(request, *args, **kwargs)
+            if state is None:
+                return view(request, *args, **kwargs)
+            parts, last_modified = state
+            etag = _etag(request, parts)
+            if last_modified is not None:
+                last_modified = timegm(last_modified.utctimetuple())
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response.setdefault('ETag', etag)
+                if last_modified is not None:
+                    response.setdefault('Last-Modified',
+                                        http_date(last_modified))
+            return response
+        return wrapper
+    return decorator
+
+
+def _following(request, author):
+    """Подписан ли посетитель на автора (поле author внешнего запроса)."""
+    return Exists(Follow.objects.filter(author=OuterRef(author),
+                                        user=request.user.pk))
+
+
+def index_state(request):
+    return [caching.version('feed:index')], None
+
+
+def popular_state(request):
+    return [caching.version('feed:popular')], None
+
+
+def group_state(request, slug):
+    group = Group.objects.filter(slug=slug).values_list(
+        'pk', 'title', 'description').first()
+    if group is None:
+        return None
+    return [group, caching.version(f'feed:group:{group[0]}')], None
+
+
+def profile_state(request, username):
+    author = (User.objects.filter(username=username)
+              .annotate(is_following=_following(request, 'pk'))
+              .values_list('pk', 'is_following', *PROFILE_FIELDS).first())
+    if author is None:
+        return None
+    return [author, caching.version(f'feed:profile:{author[0]}')], None
+
+
+def post_state(request, username, post_id):
+    post = (Post.objects.filter(pk=post_id, author__username=username)
+            .annotate(is_following=_following(request, 'author_id'),
+                      last_comment=Max('comments__updated'))
+            .values_list('updated', 'last_comment', 'is_following',
+                         *(f'author__{field}' for field in PROFILE_FIELDS))
+            .first())
+    if post is None:
+        return None
+    return [post, caching.version(f'post:{post_id}')], None
+
+
+def follow_state(request):
+    return [caching.follow_feed_version(request.user.pk)], None
@@ -0,0 +1,6 @@
+from .models import Post
+
+
+def feed_queryset(**filters):
+    """Посты для ленты: автор и группа подгружаются в том же запросе."""
+    return Post.objects.filter(**filters).select_related('author', 'group')
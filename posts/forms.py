@@ -1,5 +1,7 @@
 from .models import Post, Comment
+from .uploads import process_image
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
 
 class PostForm(forms.ModelForm):
@@ -15,6 +17,12 @@ class PostForm(forms.ModelForm):
             'image': 'Изображение для вашей записи',
         }
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            return process_image(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
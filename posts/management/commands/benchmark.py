@@ -0,0 +1,88 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.benchmarks import compare, default_scenarios, render_feed, run
+
+
+class Command(BaseCommand):
+    help = ('Замеряет представления posts: задержку p50/p99, число '
+            'запросов, время в базе и время рендеринга шаблонов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--only', nargs='+', metavar='SCENARIO',
+                            help='Замерить только эти сценарии')
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кеш перед каждым запросом')
+        parser.add_argument('--templates', action='store_true',
+                            help='Замерить только рендеринг страницы ленты')
+        parser.add_argument('--save', metavar='NAME',
+                            help='Сохранить отчёт как базовую линию NAME')
+        parser.add_argument('--compare', metavar='NAME',
+                            help='Сравнить с базовой линией NAME')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Допустимый рост p50 и числа запросов')
+        parser.add_argument('--dir', default=os.path.join(
+            settings.BASE_DIR, 'benchmarks'),
+            help='Каталог базовых линий')
+
+    def handle(self, *args, **options):
+        if options['templates']:
+            return self.render_feed(options)
+        try:
+            scenarios = default_scenarios()
+        except ValueError as error:
+            raise CommandError(
+                f'{error}. Запустите generate_bench_data.') from error
+        if options['only']:
+            scenarios = [scenario for scenario in scenarios
+                         if scenario.name in options['only']]
+
+        report = run(scenarios, iterations=options['iterations'],
+                     warmup=options['warmup'], cold=options['cold'])
+        self.stdout.write(f'{"сценарий":<18}{"p50, мс":>10}{"p99, мс":>10}'
+                          f'{"запросы":>10}{"база, мс":>10}{"шаблон, мс":>12}')
+        for name, metrics in report.items():
+            self.stdout.write(
+                f'{name:<18}{metrics["p50_ms"]:>10.1f}'
+                f'{metrics["p99_ms"]:>10.1f}{metrics["queries"]:>10g}'
+                f'{metrics["db_ms"]:>10.1f}{metrics["render_ms"]:>12.1f}')
+
+        if options['save']:
+            os.makedirs(options['dir'], exist_ok=True)
+            with open(self.path(options, 'save'), 'w') as file:
+                json.dump(report, file, indent=2, sort_keys=True)
+
+        if options['compare']:
+            try:
+                with open(self.path(options, 'compare')) as file:
+                    baseline = json.load(file)
+            except FileNotFoundError as error:
+                raise CommandError(
+                    f'Нет базовой линии {options["compare"]}') from error
+            lines, regressions = compare(report, baseline,
+                                         options['threshold'])
+            for line in lines:
+                self.stdout.write(line)
+            if regressions:
+                raise CommandError('Регрессия: ' + ', '.join(regressions))
+
+    def render_feed(self, options):
+        try:
+            report = render_feed(iterations=options['iterations'])
+        except ValueError as error:
+            raise CommandError(
+                f'{error}. Запустите generate_bench_data.') from error
+        self.stdout.write(f'{"вариант":<20}{"без кеша, мс":>14}'
+                          f'{"с кешем, мс":>14}')
+        for name, metrics in report.items():
+            self.stdout.write(f'{name:<20}{metrics["cold_ms"]:>14.2f}'
+                              f'{metrics["warm_ms"]:>14.2f}')
+
+    @staticmethod
+    def path(options, name):
+        return os.path.join(options['dir'], f'{options[name]}.json')
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from posts.bulk import (FORMATS, MODELS, export_rows, guess_format,
+                        open_file, write_rows)
+
+
+class Command(BaseCommand):
+    help = ('Выгружает пользователей, группы, посты, комментарии или '
+            'подписки в NDJSON или CSV, не загружая таблицу в память')
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=MODELS)
+        parser.add_argument('--output', default='-',
+                            help='Файл (.gz сжимается); по умолчанию '
+                                 'стандартный вывод')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='По умолчанию по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        name, path = options['model'], options['output']
+        fmt = options['format'] or guess_format(path)
+        columns = MODELS[name][1]
+        total = 0
+
+        def counted(rows):
+            nonlocal total
+            for total, row in enumerate(rows, 1):
+                if total % options['batch_size'] == 0:
+                    self.stderr.write(f'{name}: {total}')
+                yield row
+
+        with open_file(path, 'w') as file:
+            write_rows(counted(export_rows(name, options['batch_size'])),
+                       file, fmt, columns)
+        self.stderr.write(f'Выгружено {name}: {total}')
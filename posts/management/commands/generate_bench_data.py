@@ -0,0 +1,33 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from posts.benchmarks import generate
+
+
+class Command(BaseCommand):
+    help = ('Наполняет базу синтетическими данными для нагрузочных '
+            'замеров: пользователи, группы, посты, подписки и комментарии')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--comments', type=int, default=2000000)
+        parser.add_argument('--follows-per-user', type=int, default=20,
+                            help='Среднее число подписок пользователя')
+        parser.add_argument('--exponent', type=float, default=1.1,
+                            help='Показатель степенного распределения '
+                                 'популярности авторов')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        generate(users=options['users'], posts=options['posts'],
+                 groups=options['groups'], comments=options['comments'],
+                 follows_per_user=options['follows_per_user'],
+                 exponent=options['exponent'], seed=options['seed'],
+                 batch_size=options['batch_size'], log=self.stdout.write)
+        # bulk_create не вызывает сигналы: профили, счётчики и поисковый
+        # индекс достраиваются отдельно.
+        call_command('reconcile_counters', stdout=self.stdout)
+        call_command('rebuild_search_index', stdout=self.stdout)
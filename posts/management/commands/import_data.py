@@ -0,0 +1,50 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.bulk import (FORMATS, MODELS, BulkImportError, guess_format,
+                        import_rows, open_file, read_rows)
+
+
+class Command(BaseCommand):
+    help = ('Загружает выгрузку export_data пачками через bulk_create; '
+            'записи с занятыми ключами пропускаются')
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=MODELS)
+        parser.add_argument('path', help="Файл (.gz распаковывается) или "
+                                         "'-' для стандартного ввода")
+        parser.add_argument('--format', choices=FORMATS,
+                            help='По умолчанию по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--offset', type=int, default=0,
+                            help='Пропустить столько первых записей, '
+                                 'чтобы продолжить прерванную загрузку')
+        parser.add_argument('--skip-rebuild', action='store_true',
+                            help='Не пересчитывать счётчики, поисковый '
+                                 'индекс и популярное (например, до загрузки '
+                                 'последнего файла)')
+
+    def handle(self, *args, **options):
+        name, path = options['model'], options['path']
+        fmt = options['format'] or guess_format(path)
+        try:
+            with open_file(path, 'r') as file:
+                total = import_rows(
+                    name, read_rows(file, fmt, options['offset']),
+                    batch_size=options['batch_size'],
+                    offset=options['offset'], log=self.stdout.write)
+        except FileNotFoundError as error:
+            raise CommandError(error) from error
+        except BulkImportError as error:
+            raise CommandError(
+                f'{error}. Продолжить: --offset {error.position}') from error
+        self.stdout.write(f'Обработано записей {name}: {total}')
+
+        # bulk_create не вызывает сигналы: профили, счётчики, поисковый
+        # индекс и рейтинги популярного достраиваются отдельно. Пересчёт
+        # не зависит от загруженной модели, потому что до этого файлы
+        # могли загружаться с --skip-rebuild.
+        if not options['skip_rebuild']:
+            call_command('reconcile_counters', stdout=self.stdout)
+            call_command('rebuild_search_index', stdout=self.stdout)
+            call_command('rebuild_popular', stdout=self.stdout)
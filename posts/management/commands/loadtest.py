@@ -0,0 +1,28 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from posts.benchmarks import load_test
+
+
+class Command(BaseCommand):
+    help = ('Нагружает запущенный сервер быстрыми и медленными клиентами '
+            'и выводит пропускную способность и задержки')
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Адрес сервера, например '
+                                        'http://127.0.0.1:8000')
+        parser.add_argument('--paths', nargs='+', default=['/'])
+        parser.add_argument('--clients', type=int, default=10)
+        parser.add_argument('--slow-clients', type=int, default=0,
+                            help='Клиенты, отправляющие запрос по байту')
+        parser.add_argument('--slow-delay', type=float, default=1.0,
+                            help='Пауза медленного клиента между байтами')
+        parser.add_argument('--duration', type=float, default=10.0)
+
+    def handle(self, *args, **options):
+        result = load_test(
+            options['url'], paths=options['paths'],
+            clients=options['clients'], slow_clients=options['slow_clients'],
+            slow_delay=options['slow_delay'], duration=options['duration'])
+        self.stdout.write(json.dumps(result, indent=2))
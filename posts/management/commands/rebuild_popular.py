@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts.popular import rebuild
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рейтинги ленты популярного; запускается '
+            'периодически, чтобы из ленты уходили старые посты')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(f'Постов в ленте популярного: {total}')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.search import index_posts
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ids = Post.objects.order_by('pk').values_list('pk', flat=True)
+        last_id, total = 0, 0
+        while True:
+            batch = list(ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            index_posts(Post.objects.filter(pk__in=batch))
+            last_id = batch[-1]
+            total += len(batch)
+        self.stdout.write(f'Проиндексировано постов: {total}')
@@ -0,0 +1,62 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Follow, Post
+from users.models import Profile
+
+User = get_user_model()
+
+
+def count_of(queryset, field, outer_field):
+    """Подзапрос с числом строк queryset, у которых field совпадает
+    с outer_field обновляемой строки."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef(outer_field)})
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики подписчиков, подписок, постов '
+            'и комментариев по реальным данным')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        missing = User.objects.filter(profile__isnull=True)
+        created = Profile.objects.bulk_create(
+            [Profile(user=user) for user in missing.iterator()],
+            batch_size=batch_size)
+        self.stdout.write(f'Создано профилей: {len(created)}')
+
+        profiles = self.update_in_batches(
+            Profile.objects, batch_size,
+            followers_count=count_of(Follow.objects, 'author', 'user'),
+            following_count=count_of(Follow.objects, 'user', 'user'),
+            posts_count=count_of(Post.objects, 'author', 'user'),
+        )
+        self.stdout.write(f'Пересчитано профилей: {profiles}')
+
+        posts = self.update_in_batches(
+            Post.objects, batch_size,
+            comment_count=count_of(Comment.objects, 'post', 'pk'),
+        )
+        self.stdout.write(f'Пересчитано постов: {posts}')
+
+    @staticmethod
+    def update_in_batches(manager, batch_size, **values):
+        ids = manager.order_by('pk').values_list('pk', flat=True)
+        last_id, total = 0, 0
+        while True:
+            batch = list(ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                return total
+            total += manager.filter(pk__in=batch).update(**values)
+            last_id = batch[-1]
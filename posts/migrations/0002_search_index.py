@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """GIN-индекс по search_vector для PostgreSQL или таблица FTS5
+    для SQLite. Остальные СУБД обходятся поиском через icontains."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX posts_post_search_gin '
+            'ON posts_post USING gin (search_vector)')
+    elif vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('PRAGMA compile_options')
+            options = {row[0] for row in cursor.fetchall()}
+        if 'ENABLE_FTS5' in options:
+            schema_editor.execute(
+                'CREATE VIRTUAL TABLE posts_post_fts '
+                'USING fts5(text, group_text, '
+                "tokenize = 'unicode61 remove_diacritics 2')")
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS posts_post_search_gin')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
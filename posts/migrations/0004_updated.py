@@ -0,0 +1,33 @@
+# Generated by Django 2.2.6 on 2026-10-18 21:00
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def copy_dates(apps, schema_editor):
+    apps.get_model('posts', 'Post').objects.update(updated=F('pub_date'))
+    apps.get_model('posts', 'Comment').objects.update(updated=F('created'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_post_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='date updated'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_dates, migrations.RunPython.noop),
+    ]
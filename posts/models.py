@@ -1,3 +1,7 @@
+import json
+
+from django.contrib.postgres.search import SearchVectorField
+from django.core.files.storage import default_storage
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth import get_user_model
@@ -8,19 +12,62 @@ User = get_user_model()
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField('date published', auto_now_add=True)
+    updated = models.DateTimeField('date updated', auto_now=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name='posts')
     group = models.ForeignKey('Group', on_delete=models.SET_NULL,
                               blank=True, null=True,
                               related_name='group_posts')
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    thumbnails = models.TextField(blank=True, default='', editable=False)
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['-pub_date'], name='post_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date'],
+                         name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text
 
+    @property
+    def thumbnail_variants(self):
+        """Готовые миниатюры: формат -> [(url, ширина, высота), ...]."""
+        return {fmt: [(default_storage.url(name), width, height)
+                      for width, height, name in variants]
+                for fmt, variants in json.loads(self.thumbnails or '{}')
+                .items()}
+
+    def _srcset(self, fmt):
+        return ', '.join(f'{url} {width}w' for url, width, _
+                         in self.thumbnail_variants.get(fmt, ()))
+
+    @property
+    def jpeg_srcset(self):
+        return self._srcset('jpeg')
+
+    @property
+    def webp_srcset(self):
+        return self._srcset('webp')
+
+    @property
+    def thumbnail(self):
+        """Вариант JPEG по умолчанию для атрибутов src, width и height."""
+        variants = self.thumbnail_variants.get('jpeg')
+        if not variants:
+            return None
+        url, width, height = min(
+            variants, key=lambda variant: abs(variant[1] - 960))
+        return {'url': url, 'width': width, 'height': height}
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200)
@@ -38,9 +85,14 @@ class Comment(models.Model):
                                related_name='comments')
     text = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ('-created',)
+        indexes = [
+            models.Index(fields=['post', '-created'],
+                         name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return f'Comment by {self.author}'
@@ -62,4 +114,22 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='unique_followers'),
         ]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
+
 
+class PopularPost(models.Model):
+    """Рейтинг поста в ленте популярного, см. posts.popular."""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE,
+                                primary_key=True, related_name='popularity')
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score'], name='popular_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id}: {self.score:.3f}'
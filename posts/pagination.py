@@ -0,0 +1,217 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+
+from yatube import concurrency
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class CursorPage:
+    """Страница ленты, полученная по курсору."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next:
+            return self.paginator.encode(NEXT, self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous:
+            return self.paginator.encode(PREVIOUS, self.object_list[0])
+        return None
+
+
+class CursorPaginator:
+    """Постраничный вывод по ключу (field, id), по умолчанию pub_date.
+
+    В отличие от Paginator не считает COUNT(*) и не использует OFFSET:
+    любая страница стоит одного запроса по индексу, как и первая.
+    Курсоры непрозрачны для клиента — это base64 от направления и ключа
+    крайней записи страницы. Записями могут быть и словари из values()
+    с ключами field и pk.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, field='pub_date'):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.field = field
+
+    def encode(self, direction, obj):
+        if isinstance(obj, dict):
+            value, pk = obj[self.field], obj['pk']
+        else:
+            value, pk = getattr(obj, self.field), obj.pk
+        payload = json.dumps([direction, value.isoformat(), pk])
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def decode(cursor):
+        try:
+            payload = base64.urlsafe_b64decode(cursor.encode())
+            direction, value, pk = json.loads(payload.decode())
+            value = parse_datetime(value)
+        except (ValueError, TypeError, UnicodeError):
+            return None
+        if direction not in (NEXT, PREVIOUS) or value is None \
+                or not isinstance(pk, int):
+            return None
+        return direction, value, pk
+
+    def _older(self, value, pk):
+        return (Q(**{f'{self.field}__lt': value})
+                | Q(**{self.field: value, 'pk__lt': pk}))
+
+    def _newer(self, value, pk):
+        return (Q(**{f'{self.field}__gt': value})
+                | Q(**{self.field: value, 'pk__gt': pk}))
+
+    def _newest_first(self, queryset):
+        return queryset.order_by(f'-{self.field}', '-pk')
+
+    def chunk(self, cursor=None):
+        """Следующие per_page записей после курсора (с начала, если
+        курсора нет) невычисленным QuerySet с LIMIT.
+
+        В отличие от get_page не читает лишнюю запись, поэтому не знает,
+        есть ли записи дальше.
+        """
+        position = self.decode(cursor) if cursor else None
+        queryset = self.object_list
+        if position is not None and position[0] == NEXT:
+            queryset = queryset.filter(self._older(*position[1:]))
+        return self._newest_first(queryset)[:self.per_page]
+
+    def get_page(self, cursor=None):
+        """Вернуть страницу по курсору. Пустой или испорченный курсор
+        означает первую страницу."""
+        position = self.decode(cursor) if cursor else None
+        queryset = self.object_list
+        if position is None:
+            rows = list(self._newest_first(queryset)[:self.per_page + 1])
+            return CursorPage(rows[:self.per_page], self,
+                              has_next=len(rows) > self.per_page,
+                              has_previous=False)
+
+        direction, value, pk = position
+        if direction == NEXT:
+            rows = list(self._newest_first(
+                queryset.filter(self._older(value, pk)))
+                [:self.per_page + 1])
+            return CursorPage(rows[:self.per_page], self,
+                              has_next=len(rows) > self.per_page,
+                              has_previous=True)
+
+        rows = list(queryset.filter(self._newer(value, pk)).order_by(
+            self.field, 'pk')[:self.per_page + 1])
+        if not rows:
+            return self.get_page()
+        has_previous = len(rows) > self.per_page
+        return CursorPage(rows[:self.per_page][::-1], self,
+                          has_next=True,
+                          has_previous=has_previous)
+
+
+def paginate(request, object_list, per_page=10, count=None, keyset=True):
+    """Разбить ленту на страницы в режиме из settings.FEED_PAGINATION.
+
+    Если число записей уже известно (например, из счётчика профиля),
+    его можно передать в count, чтобы не выполнять COUNT(*).
+
+    Переданный в запросе курсор обрабатывается в любом режиме, чтобы
+    ссылки оставались рабочими после переключения настройки. Результаты
+    поиска упорядочены по релевантности, а не по ключу курсора, поэтому
+    всегда разбиваются по номерам страниц. Так же разбиваются ленты с
+    другим порядком, для них передаётся keyset=False.
+    """
+    cursor = request.GET.get('cursor')
+    use_cursor = cursor is not None or settings.FEED_PAGINATION == 'cursor'
+    if use_cursor and keyset and not request.GET.get('search'):
+        paginator = CursorPaginator(object_list, per_page)
+        return paginator, paginator.get_page(cursor)
+    paginator = Paginator(object_list, per_page)
+    if count is not None:
+        paginator.count = count
+        return paginator, paginator.get_page(request.GET.get('page', 1))
+    return paginator, _get_page(paginator, request.GET.get('page', 1))
+
+
+def _get_page(paginator, number):
+    """Страница по номеру. Если запросы выполняются параллельно, строки
+    страницы читаются одновременно с COUNT(*)."""
+    if not concurrency.enabled():
+        return paginator.get_page(number)
+    try:
+        number = int(number)
+    except (TypeError, ValueError):
+        return paginator.get_page(number)
+    if number < 1:
+        return paginator.get_page(number)
+    bottom = (number - 1) * paginator.per_page
+    rows, _ = concurrency.run_concurrently(
+        lambda: list(
+            paginator.object_list[bottom:bottom + paginator.per_page]),
+        lambda: paginator.count,
+    )
+    if rows or number == 1:
+        return Page(rows, number, paginator)
+    return paginator.get_page(number)
+
+
+def prefetch_tasks(page):
+    """Задачи для run_concurrently, заранее читающие строки страницы.
+
+    Без параллельности строки, как и раньше, читаются лениво в шаблоне
+    и не читаются вовсе, если фрагмент ленты взят из кеша.
+    """
+    if (not concurrency.enabled()
+            or not isinstance(page.object_list, QuerySet)):
+        return []
+
+    def fetch():
+        page.object_list = list(page.object_list)
+    return [fetch]
+
+
+def paginate_ids(request, ids, queryset, per_page=10):
+    """Разбить на страницы готовый список id постов.
+
+    Посты подгружаются из queryset одним запросом и только для текущей
+    страницы; удалённые к этому времени посты пропускаются.
+    """
+    paginator = Paginator(ids, per_page)
+    page = paginator.get_page(request.GET.get('page', 1))
+    posts = queryset.in_bulk(page.object_list)
+    page.object_list = [posts[pk] for pk in page.object_list if pk in posts]
+    return paginator, page
@@ -0,0 +1,119 @@
+"""Лента популярного.
+
+Рейтинг поста — десятичный логарифм вовлечённости плюс время публикации
+в единицах settings.POPULAR_DECAY, как в «горячем» рейтинге Reddit:
+пост, опубликованный на POPULAR_DECAY секунд позже, обгоняет старый при
+вдесятеро меньшей вовлечённости. Вовлечённость — единица плюс число
+комментариев плюс подписчики автора с весом POPULAR_FOLLOWER_WEIGHT.
+Время входит в рейтинг слагаемым, а не делителем, поэтому рейтинг не
+нужно пересчитывать по мере старения поста: он меняется только вместе
+с комментариями и подписками.
+
+Рейтинги хранятся в таблице PopularPost, и лента читает её одним
+запросом по индексу (-score), как главная лента читает посты. Новый
+пост, комментарий и подписка обновляют рейтинги затронутых постов
+фоновой задачей, после чего в таблице остаются POPULAR_SIZE лучших.
+Рейтинги записываются через INSERT ... ON CONFLICT, поэтому задачи для
+одного поста могут выполняться одновременно. Команда rebuild_popular
+пересчитывает рейтинги постов за последние POPULAR_WINDOW_DAYS дней за
+один проход; её запускают периодически, чтобы таблица не хранила
+старые посты, которые лента уже не показывает.
+"""
+import heapq
+import math
+from datetime import timedelta
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from jobs.queue import task
+from yatube import edge
+
+from . import caching
+from .models import PopularPost, Post
+
+
+def score(pub_date, comment_count, followers_count):
+    engagement = (1 + comment_count + settings.POPULAR_FOLLOWER_WEIGHT
+                  * (followers_count or 0))
+    return (math.log10(engagement)
+            + pub_date.timestamp() / settings.POPULAR_DECAY)
+
+
+def window_start():
+    """Самая ранняя дата публикации поста в ленте."""
+    return timezone.now() - timedelta(days=settings.POPULAR_WINDOW_DAYS)
+
+
+def _scored(posts):
+    """Пары (id поста, рейтинг) для постов из окна ленты."""
+    rows = posts.filter(pub_date__gte=window_start()).values_list(
+        'pk', 'pub_date', 'comment_count',
+        'author__profile__followers_count')
+    return ((pk, score(*values)) for pk, *values in rows.iterator())
+
+
+def _changed():
+    caching.invalidate('feed:popular')
+    edge.purge(reverse('popular'))
+
+
+def _upsert(scores):
+    table = PopularPost._meta.db_table
+    connection = connections[router.db_for_write(PopularPost)]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} (post_id, score) VALUES (%s, %s) '
+            'ON CONFLICT (post_id) DO UPDATE SET score = EXCLUDED.score',
+            scores)
+
+
+def _trim():
+    """Оставить в таблице POPULAR_SIZE лучших постов (и равных
+    последнему из них)."""
+    lowest = (PopularPost.objects.order_by('-score')
+              .values_list('score', flat=True)
+              [settings.POPULAR_SIZE - 1:].first())
+    if lowest is not None:
+        PopularPost.objects.filter(score__lt=lowest).delete()
+
+
+def _store(posts):
+    """Пересчитать рейтинги постов; вышедшие из окна посты удаляются."""
+    scores = list(_scored(posts))
+    with transaction.atomic():
+        removed, _ = PopularPost.objects.filter(post__in=posts).exclude(
+            post__in=[pk for pk, _ in scores]).delete()
+        if not scores and not removed:
+            return
+        _upsert(scores)
+        _trim()
+    _changed()
+
+
+@task()
+def update_posts(post_ids):
+    """Пересчитать рейтинги постов после нового комментария."""
+    _store(Post.objects.filter(pk__in=post_ids))
+
+
+@task()
+def update_author(author_id):
+    """Пересчитать рейтинги постов автора, число подписчиков которого
+    изменилось."""
+    _store(Post.objects.filter(author=author_id))
+
+
+def rebuild(batch_size=1000):
+    """Заполнить таблицу заново лучшими постами окна и вернуть их число."""
+    top = heapq.nlargest(settings.POPULAR_SIZE,
+                         _scored(Post.objects.all()), key=itemgetter(1))
+    with transaction.atomic():
+        PopularPost.objects.all().delete()
+        for start in range(0, len(top), batch_size):
+            _upsert(top[start:start + batch_size])
+    _changed()
+    return len(top)
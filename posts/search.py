@@ -0,0 +1,125 @@
+"""Полнотекстовый поиск по постам.
+
+На PostgreSQL используется колонка Post.search_vector (tsvector) с
+GIN-индексом и конфигурацией settings.SEARCH_CONFIG. На SQLite тот же
+API работает поверх виртуальной таблицы FTS5. Если ни то, ни другое
+недоступно, поиск сводится к icontains.
+
+В индекс попадает текст поста (вес A) и название с описанием его
+группы (вес B), результаты упорядочены по релевантности. Индекс и
+таблица FTS5 создаются миграцией posts.0002_search_index.
+"""
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import F, OuterRef, Subquery, TextField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Concat
+
+from .models import Group, Post
+
+FTS_TABLE = f'{Post._meta.db_table}_fts'
+
+# Базы данных (по имени), в которых таблица FTS5 уже найдена.
+_fts_ready = set()
+
+
+def _vendor():
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite' and _fts_table_exists():
+        return 'sqlite'
+    return None
+
+
+def _fts_table_exists():
+    name = connection.settings_dict['NAME']
+    if name not in _fts_ready:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s",
+                           [FTS_TABLE])
+            if cursor.fetchone() is not None:
+                _fts_ready.add(name)
+    return name in _fts_ready
+
+
+def _match_expression(query):
+    """Запрос FTS5: все слова обязательны, каждое ищется как префикс."""
+    words = re.findall(r'\w+', query)
+    return ' '.join('"{}"*'.format(word) for word in words)
+
+
+def index_posts(posts):
+    """Пересчитать поисковый индекс для переданных постов."""
+    vendor = _vendor()
+    if vendor == 'postgresql':
+        config = settings.SEARCH_CONFIG
+        group_text = Subquery(
+            Group.objects.filter(pk=OuterRef('group_id')).annotate(
+                text=Concat('title', Value(' '), 'description',
+                            output_field=TextField())
+            ).values('text')[:1]
+        )
+        posts.update(search_vector=(
+            SearchVector('text', weight='A', config=config)
+            + SearchVector(group_text, weight='B', config=config)
+        ))
+    elif vendor == 'sqlite':
+        ids = list(posts.values_list('pk', flat=True))
+        if not ids:
+            return
+        placeholders = ', '.join(['%s'] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                ids)
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text, group_text) '
+                f"SELECT p.id, p.text, "
+                f"COALESCE(g.title || ' ' || g.description, '') "
+                f'FROM {Post._meta.db_table} p '
+                f'LEFT JOIN {Group._meta.db_table} g ON g.id = p.group_id '
+                f'WHERE p.id IN ({placeholders})', ids)
+
+
+def unindex_post(post_id):
+    """Убрать удалённый пост из индекса FTS5.
+
+    В PostgreSQL вектор хранится в самой строке поста и удаляется
+    вместе с ней.
+    """
+    if _vendor() == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [post_id])
+
+
+def search_posts(queryset, query):
+    """Отфильтровать queryset постов по запросу и упорядочить
+    по убыванию релевантности."""
+    vendor = _vendor()
+    if vendor == 'postgresql':
+        search_query = SearchQuery(query, config=settings.SEARCH_CONFIG)
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-search_rank', '-pub_date')
+    if vendor == 'sqlite':
+        match = _match_expression(query)
+        if not match:
+            return queryset.none()
+        table = Post._meta.db_table
+        # RawSQL внутри __in оборачивается в скалярный подзапрос,
+        # поэтому условие с подзапросом FTS5 задано через extra().
+        return queryset.extra(
+            where=[f'{table}.id IN (SELECT rowid FROM {FTS_TABLE} '
+                   f'WHERE {FTS_TABLE} MATCH %s)'],
+            params=[match],
+        ).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 1.0, 0.5) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            [match],
+        )).order_by('-search_rank', '-pub_date')
+    return queryset.filter(text__icontains=query)
@@ -0,0 +1,239 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_init, post_save, \
+    pre_delete, pre_save
+from django.dispatch import receiver
+from django.urls import reverse
+from django.utils import timezone
+
+from . import caching, popular, search, thumbnails, timelines
+from users.models import Profile
+from yatube import edge
+
+from .models import Comment, Follow, Group, PopularPost, Post
+
+User = get_user_model()
+
+
+def _purge_profiles(*user_ids):
+    edge.purge(*(reverse('profile', args=[username])
+                 for username in User.objects.filter(pk__in=user_ids)
+                 .values_list('username', flat=True)))
+
+
+def _purge_feeds(post, group_ids=()):
+    """Обновить в кеше nginx первые страницы лент с этим постом."""
+    if not settings.EDGE_PURGE_URL:
+        return
+    slugs = Group.objects.filter(
+        pk__in={post.group_id, *group_ids} - {None}).values_list(
+        'slug', flat=True)
+    edge.purge(reverse('index'), reverse('popular'),
+               *(reverse('group_posts', args=[slug]) for slug in slugs))
+    _purge_profiles(post.author_id)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_posts(Post.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Post)
+def push_to_timelines(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and settings.FOLLOW_TIMELINES:
+        timelines.push_post.enqueue(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def index_group_posts(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_posts(instance.group_posts.all())
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    instance._post_ids = list(
+        instance.group_posts.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Group)
+def reindex_group_posts(sender, instance, **kwargs):
+    search.index_posts(Post.objects.filter(pk__in=instance._post_ids))
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and settings.FOLLOW_TIMELINES:
+        timelines.follow.enqueue(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    if settings.FOLLOW_TIMELINES:
+        timelines.unfollow.enqueue(instance.user_id, instance.author_id)
+
+
+def _decrement(field):
+    # Счётчик мог разойтись с данными до reconcile_counters; уменьшение
+    # ниже нуля нарушило бы CHECK у PositiveIntegerField.
+    return Greatest(F(field) - 1, 0)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Profile.objects.filter(user=instance.author_id).update(
+            posts_count=F('posts_count') + 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    Profile.objects.filter(user=instance.author_id).update(
+        posts_count=_decrement('posts_count'))
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F('comment_count') + 1, updated=timezone.now())
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id).update(
+        comment_count=_decrement('comment_count'), updated=timezone.now())
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Profile.objects.filter(user=instance.author_id).update(
+            followers_count=F('followers_count') + 1)
+        Profile.objects.filter(user=instance.user_id).update(
+            following_count=F('following_count') + 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    Profile.objects.filter(user=instance.author_id).update(
+        followers_count=_decrement('followers_count'))
+    Profile.objects.filter(user=instance.user_id).update(
+        following_count=_decrement('following_count'))
+
+
+@receiver(post_delete, sender=Follow)
+def reset_timelines_below_fanout_limit(sender, instance, **kwargs):
+    # Автор только что перестал быть «звездой»: его посты не рассылались
+    # по лентам, а подмешиваться при чтении больше не будут.
+    if settings.FOLLOW_TIMELINES and Profile.objects.filter(
+            user=instance.author_id,
+            followers_count=settings.TIMELINE_FANOUT_LIMIT).exists():
+        timelines.reset_followers.enqueue(instance.author_id)
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    # Отложенные через only() поля не читаются, иначе каждое обращение
+    # загрузило бы их отдельным запросом.
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+    instance._loaded_image = str(instance.__dict__.get('image') or '')
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        group_ids = [instance._loaded_group_id]
+        caching.invalidate_post(instance, group_ids=group_ids)
+        _purge_feeds(instance, group_ids)
+        instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post(sender, instance, **kwargs):
+    caching.invalidate_post(instance)
+    _purge_feeds(instance)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_commented_post(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    post = Post.objects.filter(pk=instance.post_id).only(
+        'author_id', 'group_id').first()
+    if post is not None:
+        caching.invalidate_post(post)
+        _purge_feeds(post)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_feed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        caching.invalidate(f'feed:follow:{instance.user_id}')
+        if settings.EDGE_PURGE_URL:
+            _purge_profiles(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def reset_thumbnails(sender, instance, raw=False, **kwargs):
+    instance._image_changed = (
+        not raw and 'image' in instance.__dict__
+        and (instance.image.name or '') != instance._loaded_image)
+    if instance._image_changed:
+        instance._stale_thumbnails = instance.thumbnails
+        instance.thumbnails = ''
+        instance.image_width = instance.image_height = None
+
+
+@receiver(post_save, sender=Post)
+def schedule_thumbnails(sender, instance, raw=False, **kwargs):
+    if raw or not instance._image_changed:
+        return
+    thumbnails.delete_variants(instance._stale_thumbnails)
+    instance._loaded_image = instance.image.name or ''
+    if instance.image:
+        thumbnails.schedule(instance)
+
+
+@receiver(post_delete, sender=Post)
+def delete_thumbnails(sender, instance, **kwargs):
+    thumbnails.delete_variants(instance.thumbnails)
+
+
+# Рейтинги популярного зависят от счётчиков, поэтому обработчики
+# подключаются после тех, что обновляют счётчики.
+@receiver(post_save, sender=Post)
+def score_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        popular.update_posts.enqueue([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def unscore_deleted_post(sender, instance, **kwargs):
+    # При каскадном удалении поста сигналы его комментариев успевают
+    # снова записать рейтинг.
+    PopularPost.objects.filter(post=instance.pk).delete()
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def rescore_commented_post(sender, instance, raw=False, **kwargs):
+    if not raw and kwargs.get('created', True):
+        popular.update_posts.enqueue([instance.post_id])
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def rescore_author_posts(sender, instance, raw=False, **kwargs):
+    if not raw and kwargs.get('created', True):
+        popular.update_author.enqueue(instance.author_id)
@@ -0,0 +1,22 @@
+// Кнопка «Показать ещё» подгружает следующую порцию комментариев
+// вместо перехода на отдельную страницу.
+document.addEventListener('click', function (event) {
+    var link = event.target.closest('[data-load-more]');
+    if (!link) {
+        return;
+    }
+    event.preventDefault();
+    fetch(link.dataset.loadMore, {credentials: 'same-origin'})
+        .then(function (response) {
+            if (!response.ok) {
+                throw new Error(response.statusText);
+            }
+            return response.text();
+        })
+        .then(function (html) {
+            link.outerHTML = html;
+        })
+        .catch(function () {
+            window.location = link.href;
+        });
+});
@@ -0,0 +1,74 @@
+from django import template
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.utils.safestring import mark_safe
+
+from posts import caching
+
+register = template.Library()
+
+CARD_TIMEOUT = 600
+
+
+@register.filter
+def card_version(post):
+    return caching.version(f'post:{post.pk}')
+
+
+@register.filter
+def owned_by(post, user):
+    return post.author_id == user.pk
+
+
+def _card_key(post, version, user, show):
+    return make_template_fragment_key('post_card', [
+        post.pk, version, owned_by(post, user), show])
+
+
+def _render_card(context, post, show):
+    card = context.render_context.get('post_card')
+    if card is None:
+        card = context.template.engine.get_template('post_item.html')
+        context.render_context['post_card'] = card
+    return card.render(template.Context(
+        {'post': post, 'user': context['user'], 'show': show},
+        autoescape=context.autoescape))
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post, show=False):
+    """Карточка поста из post_item.html.
+
+    Заменяет {% include 'post_item.html' %} для одного поста: готовый
+    фрагмент берётся из кеша, и шаблон карточки рендерится только при
+    промахе — с контекстом из post, user и show, а не со всем
+    контекстом страницы.
+    """
+    key = _card_key(post, card_version(post), context['user'], show)
+    html = cache.get(key)
+    if html is None:
+        html = _render_card(context, post, show)
+        cache.set(key, html, CARD_TIMEOUT)
+    return mark_safe(html)
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts, show=False):
+    """Карточки всех постов страницы ленты, как {% post_card %} в цикле.
+
+    Версии карточек и сами фрагменты читаются из кеша одним get_many
+    на страницу, а не двумя запросами на каждую карточку.
+    """
+    posts = list(posts)
+    versions = caching.versions([f'post:{post.pk}' for post in posts])
+    keys = [_card_key(post, versions[f'post:{post.pk}'], context['user'],
+                      show)
+            for post in posts]
+    cached = cache.get_many(keys)
+    missed = {}
+    for post, key in zip(posts, keys):
+        if key not in cached:
+            missed[key] = cached[key] = _render_card(context, post, show)
+    if missed:
+        cache.set_many(missed, CARD_TIMEOUT)
+    return mark_safe(''.join(cached[key] for key in keys))
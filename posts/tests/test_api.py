@@ -0,0 +1,123 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='description')
+        cls.posts = [Post.objects.create(text=f'post {number}',
+                                         author=cls.author,
+                                         group=cls.group if number % 2
+                                         else None)
+                     for number in range(5)]
+        cls.post = cls.posts[-1]
+        for number in range(3):
+            Comment.objects.create(post=cls.post, author=cls.reader,
+                                   text=f'comment {number}')
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, name, *args, **params):
+        return self.client.get(reverse(f'api_v1:{name}', args=args), params)
+
+    def test_index_walks_all_posts(self):
+        texts = []
+        cursor = None
+        while True:
+            params = {'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.get('index', **params).json()
+            texts += [post['text'] for post in data['results']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(texts, [f'post {number}'
+                                 for number in range(4, -1, -1)])
+
+    def test_embedded_author_and_group(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get('index').json()
+        first = data['results'][0]
+        self.assertEqual(first['author'], {
+            'username': 'author', 'first_name': 'Лев',
+            'last_name': 'Толстой'})
+        self.assertIsNone(first['group'])
+        self.assertEqual(data['results'][1]['group'], {'slug': 'group',
+                                                       'title': 'Группа'})
+        selects = [query['sql'] for query in queries.captured_queries
+                   if 'posts_post' in query['sql']]
+        self.assertEqual(len(selects), 1)
+
+    def test_sparse_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get('index', fields='id,text').json()
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        sql = next(query['sql'] for query in queries.captured_queries
+                   if 'posts_post' in query['sql'])
+        self.assertNotIn('auth_user', sql)
+
+        response = self.get('index', fields='id,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['detail'])
+
+    def test_group_profile_post_and_comments(self):
+        data = self.get('group_posts', 'group').json()
+        self.assertEqual(data['group']['title'], 'Группа')
+        self.assertEqual(len(data['results']), 2)
+
+        data = self.get('profile', 'author').json()
+        self.assertEqual(data['author']['posts_count'], 5)
+        self.assertEqual(len(data['results']), 5)
+
+        data = self.get('post', 'author', self.post.pk).json()
+        self.assertEqual(data['text'], 'post 4')
+        self.assertEqual(data['comment_count'], 3)
+
+        data = self.get('post_comments', 'author', self.post.pk,
+                        fields='text,author').json()
+        self.assertEqual([comment['text'] for comment in data['results']],
+                         ['comment 2', 'comment 1', 'comment 0'])
+        self.assertEqual(data['results'][0]['author']['username'],
+                         'reader')
+
+    def test_not_found(self):
+        for response in (self.get('group_posts', 'missing'),
+                         self.get('profile', 'missing'),
+                         self.get('post', 'reader', self.post.pk),
+                         self.get('post_comments', 'author', 0)):
+            with self.subTest(url=response.request['PATH_INFO']):
+                self.assertEqual(response.status_code, 404)
+                self.assertIn('detail', response.json())
+
+    def test_etag(self):
+        url = reverse('api_v1:post', args=['author', self.post.pk])
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='new')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_read_only(self):
+        response = self.client.post(reverse('api_v1:index'))
+        self.assertEqual(response.status_code, 405)
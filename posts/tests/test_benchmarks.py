@@ -0,0 +1,58 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from posts.models import Comment, Follow, Post
+from users.models import Profile
+
+
+class BenchmarkTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_bench_data', users=30, posts=200, groups=3,
+                     comments=300, follows_per_user=5, stdout=StringIO())
+
+    def test_generated_data(self):
+        """Данные созданы вместе с профилями и счётчиками."""
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertTrue(Follow.objects.exists())
+        self.assertEqual(Profile.objects.count(), 30)
+        top = Profile.objects.order_by('-followers_count').first()
+        self.assertEqual(top.followers_count,
+                         Follow.objects.filter(author=top.user).count())
+
+    def test_report_and_baseline(self):
+        """Отчёт сохраняется, пишущие сценарии не меняют данные,
+        рост числа запросов относительно базовой линии — ошибка."""
+        with tempfile.TemporaryDirectory() as directory:
+            options = {'iterations': 2, 'warmup': 1, 'dir': directory,
+                       'stdout': StringIO()}
+            call_command('benchmark', save='base', **options)
+            with open(os.path.join(directory, 'base.json')) as file:
+                report = json.load(file)
+            self.assertIn('follow_index', report)
+            self.assertGreater(report['post_view']['queries'], 0)
+            self.assertEqual(Post.objects.count(), 200)
+            self.assertEqual(Comment.objects.count(), 300)
+
+            for metrics in report.values():
+                metrics['queries'] = metrics['queries'] / 2 - 1
+                metrics['p50_ms'] = 10 ** 6
+            with open(os.path.join(directory, 'base.json'), 'w') as file:
+                json.dump(report, file)
+            with self.assertRaisesMessage(CommandError, 'Регрессия'):
+                call_command('benchmark', compare='base', **options)
+
+    def test_render_feed(self):
+        stdout = StringIO()
+        call_command('benchmark', templates=True, iterations=2,
+                     stdout=stdout)
+        for name in ('include/plain', 'post_card/cached'):
+            self.assertIn(name, stdout.getvalue())
@@ -0,0 +1,102 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from posts.bulk import MODELS
+from posts.models import Comment, Follow, Group, Post
+from posts.search import search_posts
+
+User = get_user_model()
+
+
+class ExportImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author',
+                                              first_name='Анна')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='описание')
+        cls.post = Post.objects.create(text='пост, "с кавычками"\nи строкой',
+                                       author=cls.author, group=cls.group)
+        Post.objects.create(text='без группы', author=cls.reader)
+        Comment.objects.create(post=cls.post, author=cls.reader, text='да')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def snapshot(self):
+        return {name: list(model.objects.order_by('pk').values_list(*columns))
+                for name, (model, columns) in MODELS.items()}
+
+    def export(self, extension):
+        paths = {}
+        for name in MODELS:
+            paths[name] = os.path.join(self.directory, name + extension)
+            call_command('export_data', name, output=paths[name],
+                         stderr=io.StringIO())
+        return paths
+
+    def load(self, paths, **options):
+        for name in MODELS:
+            call_command('import_data', name, paths[name],
+                         stdout=io.StringIO(), **options)
+
+    def round_trip(self, extension):
+        before = self.snapshot()
+        paths = self.export(extension)
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.load(paths)
+        self.assertEqual(self.snapshot(), before)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(post.author.profile.followers_count, 1)
+
+    def test_ndjson_gzip_round_trip(self):
+        self.round_trip('.ndjson.gz')
+
+    def test_csv_round_trip(self):
+        self.round_trip('.csv')
+
+    def test_existing_rows_are_skipped(self):
+        before = self.snapshot()
+        self.load(self.export('.ndjson'), skip_rebuild=True)
+        self.assertEqual(self.snapshot(), before)
+
+    def test_readme_sequence_rebuilds_search_index(self):
+        paths = self.export('.ndjson.gz')
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        for name in ('users', 'groups', 'posts', 'comments'):
+            call_command('import_data', name, paths[name], skip_rebuild=True,
+                         stdout=io.StringIO())
+        call_command('import_data', 'follows', paths['follows'],
+                     stdout=io.StringIO())
+        self.assertEqual(list(search_posts(Post.objects.all(), 'группы')),
+                         [Post.objects.get(text='без группы')])
+
+    def test_resume_from_offset(self):
+        newer = Comment.objects.create(post=self.post, author=self.author,
+                                       text='нет')
+        paths = self.export('.ndjson')
+        Comment.objects.all().delete()
+        call_command('import_data', 'comments', paths['comments'],
+                     offset=1, stdout=io.StringIO())
+        self.assertEqual(list(Comment.objects.all()), [newer])
+
+        with open(paths['comments'], 'a') as file:
+            file.write(json.dumps({'id': 999, 'created': 'вчера'}) + '\n')
+        with self.assertRaisesMessage(CommandError, '--offset 2'):
+            call_command('import_data', 'comments', paths['comments'],
+                         batch_size=1, stdout=io.StringIO())
+        self.assertEqual(Comment.objects.count(), 2)
@@ -0,0 +1,96 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(COMMENTS_PER_PAGE=5)
+class CommentPagesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.readers = [User.objects.create_user(username=f'reader{number}')
+                       for number in range(3)]
+        cls.post = Post.objects.create(text='post', author=cls.author)
+        cls.url = reverse('post', args=['author', cls.post.pk])
+        cls.more_url = reverse('post_comments', args=['author', cls.post.pk])
+
+    def setUp(self):
+        cache.clear()
+
+    def add_comments(self, count, post=None):
+        for number in range(count):
+            Comment.objects.create(post=post or self.post,
+                                   author=self.readers[number % 3],
+                                   text=f'comment {number}')
+
+    def cursor(self, response):
+        match = re.search(r'data-load-more="[^"]*\?cursor=([^"]+)"',
+                          response.content.decode())
+        return match and match.group(1)
+
+    def measure(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        return len(queries), len(response.content)
+
+    def test_first_page_cost_does_not_depend_on_comment_count(self):
+        self.add_comments(8)
+        queries, size = self.measure()
+        self.add_comments(40)
+        more_queries, more_size = self.measure()
+        self.assertEqual(more_queries, queries)
+        self.assertLess(abs(more_size - size), 100)
+
+    def test_load_more_walks_all_comments(self):
+        self.add_comments(12)
+        response = self.client.get(self.url)
+        self.assertContains(response, 'comment 11')
+        self.assertNotContains(response, 'comment 6')
+        texts = re.findall(r'<p>(comment \d+)</p>', response.content.decode())
+
+        cursor = self.cursor(response)
+        while cursor:
+            response = self.client.get(f'{self.more_url}?cursor={cursor}')
+            self.assertTemplateNotUsed(response, 'base.html')
+            texts += re.findall(r'<p>(comment \d+)</p>',
+                                response.content.decode())
+            cursor = self.cursor(response)
+        self.assertEqual(texts, [f'comment {number}'
+                                 for number in range(11, -1, -1)])
+
+    def test_json_and_page_fallback(self):
+        self.add_comments(7)
+        cursor = self.cursor(self.client.get(self.url))
+        data = self.client.get(
+            f'{self.more_url}?cursor={cursor}&format=json').json()
+        self.assertEqual([comment['text'] for comment in data['comments']],
+                         ['comment 1', 'comment 0'])
+        self.assertIsNone(data['next_cursor'])
+
+        response = self.client.get(f'{self.url}?cursor={cursor}')
+        self.assertContains(response, 'comment 1')
+        self.assertNotContains(response, 'comment 6')
+
+    def test_no_button_when_everything_is_shown(self):
+        self.add_comments(5)
+        self.assertIsNone(self.cursor(self.client.get(self.url)))
+
+    def test_other_post(self):
+        other = Post.objects.create(text='other', author=self.author)
+        self.add_comments(3, post=other)
+        response = self.client.get(self.more_url, {'format': 'json'})
+        self.assertEqual(response.json()['comments'], [])
+        response = self.client.get(
+            reverse('post_comments', args=['reader0', other.pk]))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.test import (LiveServerTestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from posts.benchmarks import load_test
+from posts.models import Comment, Follow, Post
+from yatube import concurrency
+
+User = get_user_model()
+
+
+@override_settings(CONCURRENT_QUERIES=True, EDGE_PURGE_URL='')
+class ConcurrentQueriesTests(TransactionTestCase):
+    """Независимые запросы страницы выполняются в пуле потоков.
+
+    TransactionTestCase: в транзакции TestCase запросы шли бы по
+    очереди, потому что соединения потоков не видят её данных.
+    """
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.posts = [Post.objects.create(text=f'post {number}',
+                                          author=self.author)
+                      for number in range(12)]
+        Comment.objects.create(post=self.posts[0], author=self.reader,
+                               text='first comment')
+        self.client.force_login(self.reader)
+
+    def test_enabled_outside_transaction(self):
+        self.assertTrue(concurrency.enabled())
+
+    def test_feed_page_and_count(self):
+        response = self.client.get(reverse('index') + '?page=2')
+        page = response.context['page']
+        self.assertEqual(page.number, 2)
+        self.assertEqual([post.text for post in page],
+                         ['post 1', 'post 0'])
+        self.assertEqual(response.context['paginator'].count, 12)
+        self.assertIsNotNone(concurrency._executor)
+
+        response = self.client.get(reverse('index') + '?page=99')
+        self.assertEqual(response.context['page'].number, 2)
+
+    def test_profile(self):
+        response = self.client.get(reverse('profile', args=['author']))
+        self.assertTrue(response.context['following'])
+        self.assertIsInstance(response.context['posts'].object_list, list)
+        self.assertContains(response, 'post 11')
+
+    def test_post_view(self):
+        post = self.posts[0]
+        response = self.client.get(reverse('post', args=['author', post.pk]))
+        self.assertEqual(response.context['post'], post)
+        self.assertTrue(response.context['following'])
+        self.assertContains(response, 'first comment')
+
+        response = self.client.get(reverse('post', args=['reader', post.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class LoadTestTests(LiveServerTestCase):
+
+    def test_load_test(self):
+        result = load_test(self.live_server_url, clients=2, slow_clients=2,
+                           slow_delay=0.05, duration=1)
+        self.assertGreater(result['requests'], 0)
+        self.assertEqual(result['errors'], 0)
+        self.assertGreater(result['throughput_rps'], 0)
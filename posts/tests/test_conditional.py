@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalResponseTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='group', slug='group',
+                                         description='group')
+        cls.post = Post.objects.create(text='post', author=cls.author,
+                                       group=cls.group)
+        cls.comment = Comment.objects.create(post=cls.post,
+                                             author=cls.reader,
+                                             text='comment')
+        cls.post_url = reverse('post', args=['author', cls.post.pk])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+        # Форма комментария ставит cookie CSRF при первом показе, и
+        # валидатор страницы поста меняется один раз.
+        self.client.get(self.post_url)
+
+    def assertNotModified(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        return response
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_are_not_rendered(self):
+        for url in (reverse('index'), reverse('group_posts', args=['group']),
+                    reverse('profile', args=['author']), self.post_url,
+                    reverse('follow_index')):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.assertTrue(etag.startswith('W/"'))
+                with self.assertTemplateNotUsed('base.html'):
+                    self.assertNotModified(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_new_post_changes_feeds(self):
+        urls = (reverse('index'), reverse('group_posts', args=['group']),
+                reverse('profile', args=['author']))
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        Post.objects.create(text='new post', author=self.author,
+                            group=self.group)
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = self.revalidate(url, etag)
+                self.assertContains(response, 'new post')
+
+    def test_comment_edit_changes_post_page(self):
+        etag = self.client.get(self.post_url)['ETag']
+        self.client.post(reverse('edit_comment', args=[
+            'author', self.post.pk, self.comment.pk]), {'text': 'edited'})
+        response = self.revalidate(self.post_url, etag)
+        self.assertContains(response, 'edited')
+        self.assertContains(response, 'Комментарий изменен успешно')
+        # Показанное сообщение снова меняет валидатор.
+        response = self.revalidate(self.post_url, response['ETag'])
+        self.assertNotContains(response, 'Комментарий изменен успешно')
+        self.assertNotModified(self.post_url,
+                               HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_follow_changes_post_page(self):
+        """Счётчики и кнопка подписки на странице поста не имеют даты,
+        поэтому If-Modified-Since не даёт 304."""
+        response = self.client.get(self.post_url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        since = http_date((timezone.now() + timedelta(minutes=1)).timestamp())
+        self.client.get(reverse('profile_follow', args=['author']))
+        response = self.client.get(self.post_url,
+                                   HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Отписаться')
+
+    def test_viewer_is_part_of_validator(self):
+        """Страница другого посетителя, новые сообщения и подписка
+        меняют ETag."""
+        url = reverse('profile', args=['author'])
+        etag = self.client.get(url)['ETag']
+        self.client.logout()
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+        self.client.force_login(self.reader)
+        self.client.get(reverse('profile_follow', args=['author']))
+        response = self.revalidate(url, etag)
+        self.assertContains(response, 'Отписаться')
+
+        etag = self.client.get(self.post_url)['ETag']
+        self.client.post(reverse('add_comment', args=['author',
+                                                      self.post.pk]),
+                         {'text': 'second'})
+        response = self.revalidate(self.post_url, etag)
+        self.assertContains(response, 'Комментарий добавлен')
+
+    def test_missing_post(self):
+        response = self.client.get(
+            reverse('post', args=['reader', self.post.pk]),
+            HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
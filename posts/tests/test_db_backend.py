@@ -0,0 +1,53 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from yatube.db.backends.postgresql.base import DatabaseWrapper
+
+
+class HealthCheckTests(SimpleTestCase):
+    """Проверка постоянного соединения перед повторным использованием.
+
+    Настоящий PostgreSQL не нужен: соединение подменяется заглушкой.
+    """
+
+    def make_wrapper(self, health_checks=True):
+        wrapper = DatabaseWrapper({
+            'NAME': 'yatube', 'USER': '', 'PASSWORD': '', 'HOST': '',
+            'PORT': '', 'OPTIONS': {}, 'AUTOCOMMIT': True,
+            'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': health_checks,
+            'TIME_ZONE': None,
+        }, alias='health')
+        wrapper.connection = mock.Mock(closed=0)
+        wrapper.ensure_connection = mock.Mock()
+        wrapper.autocommit = True
+        wrapper.close_at = None
+        return wrapper
+
+    def test_broken_connection_is_closed_on_reuse(self):
+        wrapper = self.make_wrapper()
+        wrapper.close_if_unusable_or_obsolete()
+        with mock.patch.object(wrapper, 'is_usable', return_value=False):
+            wrapper.close_if_health_check_failed()
+        self.assertIsNone(wrapper.connection)
+
+    def test_check_runs_once_per_request(self):
+        wrapper = self.make_wrapper()
+        wrapper.close_if_unusable_or_obsolete()
+        with mock.patch.object(wrapper, 'is_usable',
+                               return_value=True) as is_usable:
+            wrapper.close_if_health_check_failed()
+            wrapper.close_if_health_check_failed()
+            self.assertEqual(is_usable.call_count, 1)
+
+            wrapper.close_if_unusable_or_obsolete()
+            wrapper.close_if_health_check_failed()
+            self.assertEqual(is_usable.call_count, 2)
+        self.assertIsNotNone(wrapper.connection)
+
+    def test_disabled(self):
+        wrapper = self.make_wrapper(health_checks=False)
+        wrapper.close_if_unusable_or_obsolete()
+        with mock.patch.object(wrapper, 'is_usable') as is_usable:
+            wrapper.close_if_health_check_failed()
+        is_usable.assert_not_called()
@@ -0,0 +1,201 @@
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock, skipUnless
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.flatpages.models import FlatPage
+from django.contrib.sites.models import Site
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from jobs import queue
+from posts.models import Comment, Follow, Group, Post
+from yatube import edge
+
+User = get_user_model()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@override_settings(EDGE_CACHE_SECONDS=10)
+class CacheControlTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.create(text='post', author=cls.user)
+        page = FlatPage.objects.create(url='/about-us/', title='about',
+                                       content='about')
+        page.sites.add(Site.objects.get_current())
+
+    def test_anonymous_pages_are_shared(self):
+        for url in (reverse('index'), reverse('profile', args=['author']),
+                    reverse('about')):
+            with self.subTest(url=url):
+                header = self.client.get(url)['Cache-Control']
+                self.assertIn('public', header)
+                self.assertIn('s-maxage=10', header)
+                self.assertIn('max-age=0', header)
+
+    def test_personal_pages_are_private(self):
+        self.client.force_login(self.user)
+        header = self.client.get(reverse('index'))['Cache-Control']
+        self.assertIn('private', header)
+        self.assertNotIn('s-maxage', header)
+
+
+class PurgeTests(TestCase):
+    """Запись обновляет затронутые страницы через внутренний адрес."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.requested = requested = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                requested.append(self.path)
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        cls.server = HTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=cls.server.serve_forever,
+                         daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='group', slug='group',
+                                         description='group')
+
+    def purged(self, action):
+        """Пути, которые запросила запись action."""
+        self.requested.clear()
+        url = f'http://127.0.0.1:{self.server.server_port}'
+        with override_settings(EDGE_PURGE_URL=url), \
+                mock.patch.object(queue.transaction, 'on_commit',
+                                  side_effect=lambda func: func()):
+            action()
+        return set(self.requested)
+
+    def test_post_and_comment(self):
+        post = self.purged(lambda: Post.objects.create(
+            text='post', author=self.author, group=self.group))
+        self.assertEqual(post, {'/', '/popular/', '/group/group/',
+                                '/author/'})
+        post = Post.objects.get()
+        self.assertEqual(self.purged(lambda: Comment.objects.create(
+            post=post, author=self.reader, text='comment')), {
+            '/', '/popular/', '/group/group/', '/author/'})
+
+    def test_follow(self):
+        self.assertEqual(self.purged(lambda: Follow.objects.create(
+            user=self.reader, author=self.author)), {'/author/', '/reader/'})
+
+    @override_settings(EDGE_PURGE_URL='')
+    def test_disabled(self):
+        with mock.patch.object(edge.refresh, 'enqueue') as enqueue:
+            Post.objects.create(text='post', author=self.author)
+        enqueue.assert_not_called()
+
+
+@skipUnless(shutil.which('nginx'), 'Нужен nginx')
+@override_settings(EDGE_CACHE_SECONDS=2)
+class NginxMicroCacheTests(LiveServerTestCase):
+    """Поставляемый nginx/default.conf перед живым сервером Django."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.chmod(self.directory, 0o777)
+        self.port, self.purge_port = free_port(), free_port()
+        with open(os.path.join(settings.BASE_DIR, 'nginx',
+                               'default.conf')) as file:
+            site = (file.read()
+                    .replace('http://web:8000', 'http://127.0.0.1:'
+                             f'{self.server_thread.port}')
+                    .replace('/var/cache/nginx/yatube',
+                             os.path.join(self.directory, 'cache'))
+                    .replace('/var/html', self.directory)
+                    .replace('listen 80;', f'listen {self.port};')
+                    .replace('listen 8081;', f'listen {self.purge_port};'))
+        with open(os.path.join(self.directory, 'site.conf'), 'w') as file:
+            file.write(site)
+        config = os.path.join(self.directory, 'nginx.conf')
+        with open(config, 'w') as file:
+            file.write(f'''
+                daemon off;
+                pid {self.directory}/nginx.pid;
+                error_log {self.directory}/error.log;
+                events {{}}
+                http {{
+                    access_log off;
+                    client_body_temp_path {self.directory}/body;
+                    proxy_temp_path {self.directory}/proxy;
+                    fastcgi_temp_path {self.directory}/fastcgi;
+                    uwsgi_temp_path {self.directory}/uwsgi;
+                    scgi_temp_path {self.directory}/scgi;
+                    include {self.directory}/site.conf;
+                }}
+            ''')
+        self.nginx = subprocess.Popen(
+            ['nginx', '-p', self.directory, '-c', config])
+        for _ in range(50):
+            try:
+                socket.create_connection(('127.0.0.1', self.port)).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        self.author = User.objects.create_user(username='author')
+
+    def tearDown(self):
+        self.nginx.terminate()
+        self.nginx.wait()
+        shutil.rmtree(self.directory)
+
+    def get(self):
+        with urlopen(f'http://127.0.0.1:{self.port}/') as response:
+            return (response.headers['X-Cache-Status'],
+                    response.read().decode())
+
+    def test_new_post_appears_within_ttl(self):
+        self.get()
+        status, _ = self.get()
+        self.assertEqual(status, 'HIT')
+
+        Post.objects.create(text='fresh post', author=self.author)
+        _, page = self.get()
+        self.assertNotIn('fresh post', page)
+        time.sleep(settings.EDGE_CACHE_SECONDS + 0.5)
+        _, page = self.get()
+        self.assertIn('fresh post', page)
+
+    def test_write_refreshes_cache(self):
+        self.get()
+        with override_settings(
+                EDGE_PURGE_URL=f'http://127.0.0.1:{self.purge_port}'):
+            Post.objects.create(text='purged post', author=self.author)
+        status, page = self.get()
+        self.assertEqual(status, 'HIT')
+        self.assertIn('purged post', page)
@@ -1,5 +1,80 @@
+import shutil
+import tempfile
+from io import BytesIO
 
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
+from posts.models import Post
 
+User = get_user_model()
 
+MEDIA_ROOT = tempfile.mkdtemp()
 
+
+def make_jpeg(size=(3000, 1000), orientation=None):
+    exif = Image.Exif()
+    exif[0x010f] = 'Camera maker'
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = BytesIO()
+    Image.new('RGB', size, (10, 120, 200)).save(buffer, 'JPEG',
+                                                exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_MASTER_SIZE=1200)
+class PostImageUploadTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='uploader')
+        self.client.force_login(self.user)
+
+    def upload(self, content, name='photo.jpg', text='post with photo'):
+        return self.client.post(reverse('new_post'), {
+            'text': text,
+            'image': SimpleUploadedFile(name, content,
+                                        content_type='image/jpeg'),
+        })
+
+    def test_image_is_reencoded(self):
+        """Оригинал уменьшается, поворачивается по EXIF и сохраняется
+        без метаданных."""
+        self.upload(make_jpeg(orientation=6))
+        post = Post.objects.get(text='post with photo')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (400, 1200))
+            self.assertFalse(image.getexif())
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые загрузки хранятся в одном файле."""
+        content = make_jpeg()
+        self.upload(content, text='first')
+        self.upload(content, name='copy.jpg', text='second')
+        first = Post.objects.get(text='first')
+        second = Post.objects.get(text='second')
+        self.assertEqual(first.image.name, second.image.name)
+
+    @override_settings(IMAGE_MAX_PIXELS=1000)
+    def test_pixel_limit(self):
+        response = self.upload(make_jpeg(size=(100, 20)))
+        self.assertFormError(response, 'form', 'image',
+                             'Изображение слишком большое: 100×20 '
+                             'пикселей, допустимо не больше 1000.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_MAX_UPLOAD_SIZE=1024)
+    def test_size_limit(self):
+        response = self.upload(make_jpeg())
+        self.assertFormError(response, 'form', 'image',
+                             'Файл слишком большой: не больше 1,0\xa0КБ.')
+        self.assertFalse(Post.objects.exists())
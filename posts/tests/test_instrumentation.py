@@ -0,0 +1,55 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+@override_settings(PERFORMANCE_SAMPLE_RATE=1)
+class PerformanceMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        Post.objects.create(text='post body', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_record(self, client, url):
+        with self.assertLogs('yatube.performance', 'INFO') as logs:
+            response = client.get(url)
+        return response, json.loads(logs.records[-1].getMessage())
+
+    def test_log_record(self):
+        """Замеры запроса пишутся в лог одной JSON-строкой."""
+        response, record = self.get_record(self.client, reverse('index'))
+        self.assertEqual(record['view'], 'index')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['bytes'], len(response.content))
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['render_ms'], 0)
+        self.assertGreater(record['cache_misses'], 0)
+        self.assertNotIn('Server-Timing', response)
+
+        _, record = self.get_record(self.client, reverse('index'))
+        self.assertGreater(record['cache_hits'], 0)
+
+    def test_server_timing_for_staff(self):
+        self.client.force_login(self.staff)
+        response, record = self.get_record(self.client, reverse('index'))
+        self.assertIn(f'db;dur={record["db_ms"]}',
+                      response['Server-Timing'])
+        self.assertIn('render;dur=', response['Server-Timing'])
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=0)
+    def test_sampling(self):
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('yatube.performance', 'INFO'):
+                self.client.get(reverse('index'))
@@ -0,0 +1,48 @@
+"""Метрики Prometheus, в том числе собранные с нескольких процессов.
+
+Как и в test_shared_cache, воркеры запускаются через spawn, поэтому
+модели на уровне модуля не импортируются.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+
+def observe_upload(path):
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = path
+    from yatube.metrics import UPLOAD_SIZE
+    UPLOAD_SIZE.observe(1000)
+
+
+class MetricsTests(TestCase):
+
+    def test_view_metrics(self):
+        self.client.get(reverse('index'))
+        response = self.client.get('/metrics')
+        self.assertContains(
+            response,
+            'yatube_request_latency_seconds_count{method="GET",view="index"}')
+        self.assertContains(response,
+                            'yatube_request_db_queries_bucket{le="0.0",'
+                            'view="index"}')
+
+    def test_metrics_from_all_workers(self):
+        """/metrics суммирует метрики всех процессов-воркеров."""
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path, True)
+        context = multiprocessing.get_context('spawn')
+        for _ in range(2):
+            process = context.Process(target=observe_upload, args=(path,))
+            process.start()
+            process.join(timeout=60)
+            self.assertEqual(process.exitcode, 0)
+
+        with mock.patch.dict(os.environ, PROMETHEUS_MULTIPROC_DIR=path):
+            response = self.client.get('/metrics')
+        self.assertContains(response, 'yatube_upload_bytes_count 2.0')
+        self.assertContains(response, 'yatube_upload_bytes_sum 2000.0')
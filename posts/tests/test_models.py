@@ -0,0 +1,143 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.feeds import feed_queryset
+from posts.models import Post, Comment, Follow, Group
+from users.models import Profile
+
+User = get_user_model()
+
+
+class CounterTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def profile(self, user):
+        return Profile.objects.get(user=user)
+
+    def test_follow_counters(self):
+        self.client.get(reverse('profile_follow', args=['author']))
+        self.assertEqual(self.profile(self.author).followers_count, 1)
+        self.assertEqual(self.profile(self.user).following_count, 1)
+        self.client.get(reverse('profile_unfollow', args=['author']))
+        self.assertEqual(self.profile(self.author).followers_count, 0)
+        self.assertEqual(self.profile(self.user).following_count, 0)
+
+    def test_post_and_comment_counters(self):
+        self.client.post(reverse('new_post'), {'text': 'text'})
+        post = Post.objects.get(author=self.user)
+        self.assertEqual(self.profile(self.user).posts_count, 1)
+
+        self.client.post(reverse('add_comment', args=['user', post.id]),
+                         {'text': 'comment'})
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+        comment = post.comments.get()
+        self.client.get(reverse('delete_comment',
+                                args=['user', post.id, comment.id]))
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+
+        self.client.post(reverse('post_delete', args=['user', post.id]))
+        self.assertEqual(self.profile(self.user).posts_count, 0)
+
+    def test_drifted_counters_stay_at_zero(self):
+        post = Post.objects.create(text='text', author=self.user)
+        comment = Comment.objects.create(post=post, author=self.user,
+                                         text='text')
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.update(comment_count=0)
+        Profile.objects.update(followers_count=0, following_count=0,
+                               posts_count=0)
+
+        comment.delete()
+        self.client.get(reverse('profile_unfollow', args=['author']))
+        self.client.post(reverse('post_delete', args=['user', post.id]))
+
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(self.profile(self.author).followers_count, 0)
+        self.assertEqual(self.profile(self.user).following_count, 0)
+
+    def test_reconcile_counters(self):
+        post = Post.objects.create(text='text', author=self.author)
+        Comment.objects.create(post=post, author=self.user, text='text')
+        Follow.objects.create(user=self.user, author=self.author)
+        Profile.objects.update(followers_count=7, posts_count=0)
+        Post.objects.update(comment_count=3)
+        Profile.objects.filter(user=self.user).delete()
+
+        call_command('reconcile_counters', stdout=StringIO())
+
+        author = self.profile(self.author)
+        self.assertEqual((author.followers_count, author.following_count,
+                          author.posts_count), (1, 0, 1))
+        user = self.profile(self.user)
+        self.assertEqual((user.followers_count, user.following_count,
+                          user.posts_count), (0, 1, 0))
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+    def test_profile_and_post_pages_do_not_count(self):
+        post = Post.objects.create(text='text', author=self.author)
+        urls = [reverse('profile', args=['author']),
+                reverse('post', args=['author', post.id])]
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as context:
+                    response = self.client.get(url)
+                self.assertContains(response, 'Записей: 1')
+                for query in context.captured_queries:
+                    self.assertNotIn('COUNT(', query['sql'])
+
+
+class FeedIndexTests(TestCase):
+    """Запросы лент должны идти по составным индексам, а не по таблице."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.group = Group.objects.create(title='group', slug='group',
+                                         description='group')
+        cls.post = Post.objects.create(text='text', author=cls.user,
+                                       group=cls.group)
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # На маленьких таблицах планировщик предпочитает Seq Scan.
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_feed_indexes(self):
+        cases = [
+            (feed_queryset()[:10], 'post_pub_date_idx'),
+            (feed_queryset(author=self.user)[:10],
+             'post_author_pub_date_idx'),
+            (feed_queryset(group=self.group)[:10],
+             'post_group_pub_date_idx'),
+            (self.post.comments.all()[:10], 'comment_post_created_idx'),
+            (Follow.objects.filter(author=self.user).values('user'),
+             'follow_author_user_idx'),
+        ]
+        for queryset, index_name in cases:
+            with self.subTest(index=index_name):
+                self.assertUsesIndex(queryset, index_name)
@@ -0,0 +1,123 @@
+import io
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from jobs import queue
+from posts import popular
+from posts.models import Comment, Follow, PopularPost, Post
+
+User = get_user_model()
+
+
+@override_settings(EDGE_PURGE_URL='')
+@mock.patch.object(queue.transaction, 'on_commit',
+                   side_effect=lambda func: func())
+class PopularTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        cache.clear()
+
+    def score(self, post):
+        return PopularPost.objects.get(post=post).score
+
+    def age(self, post, **delta):
+        Post.objects.filter(pk=post.pk).update(
+            pub_date=timezone.now() - timedelta(**delta))
+
+    def test_score(self, on_commit):
+        now = timezone.now()
+        self.assertGreater(popular.score(now, 0, 0),
+                           popular.score(now - timedelta(hours=1), 0, 0))
+        # Десятикратная вовлечённость перевешивает POPULAR_DECAY возраста.
+        self.assertGreater(
+            popular.score(now - timedelta(hours=11), 9, 0),
+            popular.score(now, 0, 0))
+        self.assertEqual(popular.score(now, 1, 10), popular.score(now, 2, 0))
+
+    def test_scores_follow_comments_and_follows(self, on_commit):
+        post = Post.objects.create(text='пост', author=self.author)
+        created = self.score(post)
+        Comment.objects.create(post=post, author=self.reader, text='да')
+        commented = self.score(post)
+        self.assertGreater(commented, created)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertGreater(self.score(post), commented)
+        Follow.objects.all().delete()
+        self.assertEqual(self.score(post), commented)
+
+        post.delete()
+        self.assertFalse(PopularPost.objects.exists())
+
+    @override_settings(POPULAR_SIZE=2)
+    def test_rebuild(self, on_commit):
+        old, discussed, fresh = [
+            Post.objects.create(text=text, author=self.author)
+            for text in ('старый', 'обсуждаемый', 'новый')]
+        for number in range(20):
+            Comment.objects.create(post=discussed, author=self.reader,
+                                   text=str(number))
+        self.age(old, days=8)
+        self.age(discussed, hours=12)
+        PopularPost.objects.all().delete()
+        stdout = io.StringIO()
+        call_command('rebuild_popular', stdout=stdout)
+        self.assertIn('2', stdout.getvalue())
+        self.assertEqual(
+            list(PopularPost.objects.order_by('-score')
+                 .values_list('post', flat=True)),
+            [discussed.pk, fresh.pk])
+
+    def test_feed(self, on_commit):
+        posts = [Post.objects.create(text=f'пост {number}', author=self.author)
+                 for number in range(3)]
+        Comment.objects.create(post=posts[0], author=self.reader, text='да')
+        response = self.client.get(reverse('popular'))
+        self.assertEqual([post.pk for post in response.context['page']],
+                         [posts[0].pk, posts[2].pk, posts[1].pk])
+        self.assertEqual(resolve('/popular/').url_name, 'popular')
+
+    @override_settings(POPULAR_SIZE=2)
+    def test_updates_keep_top_posts(self, on_commit):
+        posts = [Post.objects.create(text=f'пост {number}', author=self.author)
+                 for number in range(3)]
+        self.assertEqual(
+            set(PopularPost.objects.values_list('post', flat=True)),
+            {posts[1].pk, posts[2].pk})
+        popular.update_posts([posts[2].pk])
+        self.assertEqual(PopularPost.objects.count(), 2)
+
+    def test_feed_hides_posts_outside_window(self, on_commit):
+        old, fresh = [Post.objects.create(text=text, author=self.author)
+                      for text in ('старый', 'новый')]
+        self.age(old, days=8)
+        response = self.client.get(reverse('popular'))
+        self.assertEqual(list(response.context['page']), [fresh])
+
+        popular.update_posts([old.pk, fresh.pk])
+        self.assertEqual(list(PopularPost.objects.values_list(
+            'post', flat=True)), [fresh.pk])
+
+    def test_feed_costs_as_much_as_index(self, on_commit):
+        for number in range(15):
+            Post.objects.create(text=f'пост {number}', author=self.author)
+        counts = []
+        for name in ('index', 'popular'):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse(name), {'page': 2})
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
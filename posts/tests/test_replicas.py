@@ -0,0 +1,119 @@
+"""Чтение с реплики и закрепление за основной базой после записи.
+
+Реплика — вторая база SQLite, снимок тестовой базы до создания данных.
+Она не получает новых записей, то есть ведёт себя как сильно отставшая
+реплика: всё, что прочитано из основной базы, на ней отсутствует.
+"""
+import os
+import sqlite3
+import tempfile
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import caching
+from posts.models import Post
+from yatube import routers
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Снимок реплики делается '
+                                           'средствами SQLite')
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        descriptor, cls.replica_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(descriptor)
+        default = connections['default']
+        default.ensure_connection()
+        replica = sqlite3.connect(cls.replica_path)
+        default.connection.backup(replica)
+        replica.close()
+        connections.databases['replica'] = dict(default.settings_dict,
+                                                NAME=cls.replica_path)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.databases['replica']
+        os.remove(cls.replica_path)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer')
+        cls.post = Post.objects.create(text='fresh post', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        routers._health.clear()
+
+    def test_reads_go_to_replica(self):
+        """Без записи чтение идёт с реплики, где поста ещё нет."""
+        response = self.client.get(reverse('index'))
+        self.assertNotContains(response, 'fresh post')
+        response = self.client.get(
+            reverse('post', args=[self.user.username, self.post.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_read_your_writes(self):
+        """После записи пользователь читает из основной базы."""
+        self.client.force_login(self.user)
+        self.client.cookies['primary_pin'] = '1'
+        response = self.client.post(reverse('new_post'),
+                                    {'text': 'my new post'})
+        self.assertIn('primary_pin', response.cookies)
+        self.assertEqual(response.cookies['primary_pin']['max-age'], 10)
+
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'my new post')
+
+        del self.client.cookies['primary_pin']
+        response = self.client.get(reverse('index'))
+        self.assertNotContains(response, 'my new post')
+
+    def test_database_cache_does_not_pin(self):
+        """Таблица кеша есть только в основной базе, и запись в неё не
+        закрепляет запрос за основной базой."""
+        call_command('createcachetable', 'test_cache_table')
+        db_cache = DatabaseCache('test_cache_table', {})
+        tokens = routers.use_replicas()
+        try:
+            db_cache.set('key', 'value')
+            self.assertEqual(db_cache.get('key'), 'value')
+            self.assertFalse(routers.wrote())
+        finally:
+            routers.restore(tokens)
+
+    def test_lagging_replica_is_skipped(self):
+        with mock.patch('yatube.routers.replica_lag', return_value=60):
+            response = self.client.get(reverse('index'))
+        self.assertContains(response, 'fresh post')
+
+    def test_unreachable_replica_is_skipped(self):
+        with mock.patch('yatube.routers.replica_lag',
+                        side_effect=routers.DatabaseError):
+            response = self.client.get(reverse('index'))
+        self.assertContains(response, 'fresh post')
+
+    def test_versions_reset_after_replica_lag(self):
+        """Версии фрагментов сбрасываются ещё раз, когда реплика
+        догонит основную базу."""
+        caching.invalidate('feed:index')
+        first = caching.version('feed:index')
+        self.assertIn('feed:index', caching._pending)
+        self.assertIsNotNone(caching._timer)
+        caching._flush_pending()
+        self.assertNotEqual(caching.version('feed:index'), first)
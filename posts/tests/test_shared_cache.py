@@ -0,0 +1,63 @@
+"""Несколько процессов-воркеров против одного общего кеша.
+
+Каждый воркер — отдельный процесс со своим django.setup(), как воркер
+gunicorn. Проверяется, что версия, созданная или сброшенная в одном
+процессе, видна во всех остальных.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+
+def run_worker(cache_backend, cache_location, action, results):
+    os.environ['CACHE_BACKEND'] = cache_backend
+    os.environ['CACHE_LOCATION'] = cache_location
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    import django
+    django.setup()
+    from posts import caching
+    if action == 'invalidate':
+        caching.invalidate('feed:index')
+    results.put(caching.version('feed:index'))
+
+
+class SharedCacheTests(SimpleTestCase):
+    workers = 3
+
+    def setUp(self):
+        self.context = multiprocessing.get_context('spawn')
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, True)
+
+    def run_workers(self, cache_backend, action='read', count=None):
+        results = self.context.Queue()
+        processes = [
+            self.context.Process(
+                target=run_worker,
+                args=(cache_backend, self.location, action, results))
+            for _ in range(count or self.workers)
+        ]
+        for process in processes:
+            process.start()
+        tokens = [results.get(timeout=60) for _ in processes]
+        for process in processes:
+            process.join(timeout=60)
+            self.assertEqual(process.exitcode, 0)
+        return tokens
+
+    def test_workers_share_versions(self):
+        first = self.run_workers('file', count=1)[0]
+        self.assertEqual(set(self.run_workers('file')), {first})
+
+    def test_invalidation_reaches_other_workers(self):
+        before = self.run_workers('file', count=1)[0]
+        after = self.run_workers('file', action='invalidate', count=1)[0]
+        self.assertNotEqual(before, after)
+        self.assertEqual(set(self.run_workers('file')), {after})
+
+    def test_locmem_is_not_shared(self):
+        tokens = self.run_workers('locmem')
+        self.assertEqual(len(set(tokens)), self.workers)
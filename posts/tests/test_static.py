@@ -0,0 +1,64 @@
+import gzip
+import os
+import shutil
+import tempfile
+from unittest import skipIf
+
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from yatube import storage
+
+CSS = 'body { background: url("logo.svg"); }\n' * 20
+SVG = '<svg xmlns="http://www.w3.org/2000/svg"></svg>'
+
+
+class CompressedManifestStorageTests(SimpleTestCase):
+
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.root = tempfile.mkdtemp()
+        for name, content in (('site.css', CSS), ('logo.svg', SVG)):
+            with open(os.path.join(self.source, name), 'w') as file:
+                file.write(content)
+        settings = override_settings(
+            STATIC_ROOT=self.root, STATICFILES_DIRS=[self.source],
+            STATICFILES_FINDERS=[
+                'django.contrib.staticfiles.finders.FileSystemFinder'],
+            STATICFILES_STORAGE=(
+                'yatube.storage.CompressedManifestStaticFilesStorage'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.source)
+        shutil.rmtree(self.root)
+
+    def hashed(self, name):
+        url = Template('{% load static %}{% static name %}').render(
+            Context({'name': name}))
+        self.assertRegex(url, r'^/static/\w+\.[0-9a-f]{12}\.\w+$')
+        return os.path.join(self.root, os.path.basename(url))
+
+    def test_gzip_variant(self):
+        path = self.hashed('site.css')
+        with open(path, 'rb') as file:
+            content = file.read()
+        self.assertIn(os.path.basename(self.hashed('logo.svg')).encode(),
+                      content)
+        with open(path + '.gz', 'rb') as file:
+            self.assertEqual(gzip.decompress(file.read()), content)
+
+    @skipIf(storage.brotli is None, 'Нужен пакет brotli')
+    def test_brotli_variant(self):
+        path = self.hashed('site.css')
+        with open(path, 'rb') as file, open(path + '.br', 'rb') as variant:
+            self.assertEqual(storage.brotli.decompress(variant.read()),
+                             file.read())
+
+    def test_small_files_are_not_compressed(self):
+        path = self.hashed('logo.svg')
+        self.assertFalse(os.path.exists(path + '.gz'))
+        self.assertFalse(os.path.exists(path + '.br'))
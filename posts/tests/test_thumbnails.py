@@ -0,0 +1,108 @@
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+from PIL import Image
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image(name='photo.png', size=(2000, 1000)):
+    buffer = BytesIO()
+    Image.new('RGBA', size, (200, 10, 10, 255)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_WIDTHS=(480, 960))
+class ThumbnailTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='photographer')
+        self.post = Post.objects.create(text='post body', author=self.user,
+                                        image=make_image())
+
+    def test_generate_stores_variants(self):
+        """Миниатюры строятся во всех ширинах с пропорциями карточки."""
+        thumbnails.generate(self.post.pk, self.post.image.name)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.image_width, self.post.image_height),
+                         (2000, 1000))
+        jpeg = self.post.thumbnail_variants['jpeg']
+        self.assertEqual([(width, height) for _, width, height in jpeg],
+                         [(480, 170), (960, 339)])
+        for fmt_variants in self.post.thumbnail_variants.values():
+            for url, _, _ in fmt_variants:
+                name = url[len(default_storage.base_url):]
+                self.assertTrue(default_storage.exists(name))
+        self.assertIn('960w', self.post.jpeg_srcset)
+        self.assertEqual(self.post.thumbnail['width'], 960)
+
+    def test_card_uses_srcset(self):
+        """Карточка выводит srcset готовых миниатюр, а до их появления —
+        исходное изображение."""
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, self.post.image.url)
+        self.assertNotContains(response, 'srcset')
+
+        thumbnails.generate(self.post.pk, self.post.image.name)
+        self.post.refresh_from_db()
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, self.post.jpeg_srcset)
+        self.assertContains(response, 'width="960" height="339"')
+
+    def test_new_image_drops_old_variants(self):
+        """Смена изображения удаляет прежние миниатюры."""
+        thumbnails.generate(self.post.pk, self.post.image.name)
+        self.post.refresh_from_db()
+        old_names = [name for variants in
+                     json.loads(self.post.thumbnails).values()
+                     for _, _, name in variants]
+
+        self.post.image = make_image('other.png')
+        self.post.save()
+        self.assertEqual(self.post.thumbnails, '')
+        self.assertIsNone(self.post.image_width)
+        for name in old_names:
+            self.assertFalse(default_storage.exists(name))
+
+    def test_regeneration_overwrites_variants(self):
+        """Повторное построение перезаписывает файлы под теми же именами."""
+        first = thumbnails.render_variants(self.post.pk,
+                                           self.post.image.name)
+        second = thumbnails.render_variants(self.post.pk,
+                                            self.post.image.name)
+        self.assertEqual(second, first)
+        names = {name for variants in first[2].values()
+                 for _, _, name in variants}
+        prefix = os.path.basename(min(names)).rsplit('-', 1)[0]
+        _, files = default_storage.listdir(settings.THUMBNAIL_DIR)
+        self.assertEqual(
+            {os.path.join(settings.THUMBNAIL_DIR, name)
+             for name in files if name.startswith(prefix)},
+            names)
+
+    def test_stale_image_is_ignored(self):
+        """Миниатюры для уже заменённого изображения не сохраняются."""
+        thumbnails.generate(self.post.pk, 'posts/missing.png')
+        thumbnails.generate(self.post.pk, 'posts/other.png')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.thumbnails, '')
@@ -1,14 +1,27 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from posts.models import Post, Group, Follow
+from jobs.models import Job
+from posts import caching, timelines
+from posts.models import Comment, Post, Group, Follow
 
 User = get_user_model()
 
+MEDIA_ROOT = tempfile.mkdtemp()
+
 
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
 class StaticViewTests(TestCase):
 
     @classmethod
@@ -39,6 +52,11 @@ class StaticViewTests(TestCase):
         cls.add_comment_url = reverse('add_comment',
                                       args=[cls.user, cls.new_post.id])
 
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
     def contains_check(self, client=None, text=None, id=None):
         group_url = reverse('group_posts', args=[self.group])
         index_url = reverse('index')
@@ -142,18 +160,40 @@ class StaticViewTests(TestCase):
                                  error_message)
 
     def test_cache_index(self):
+        cache.clear()
         new = reverse('new_post')
         index = reverse('index')
         self.authorized_client.get(index)
+        with CaptureQueriesContext(connection) as cached:
+            self.authorized_client.get(index)
+        self.assertFalse(any('"posts_post"."text"' in query['sql']
+                             for query in cached.captured_queries))
         self.authorized_client.post(new,
                                     {'author': self.user,
                                      'text': 'cache text', },
                                     )
-        second_response = self.authorized_client.get(index)
-        self.assertNotContains(second_response, 'cache text')
+        response = self.authorized_client.get(index)
+        self.assertContains(response, 'cache text')
+
+    def test_cache_post_card(self):
+        """Карточка берётся из кеша, пока пост не изменится."""
         cache.clear()
-        third_response = self.authorized_client.get(index)
-        self.assertContains(third_response, 'cache text')
+        url = reverse('post', args=[self.user, self.new_post.id])
+        response = self.authorized_client.get(url)
+        self.assertTemplateUsed(response, 'post_item.html')
+        self.assertContains(response, 'Редактировать')
+        response = self.authorized_client.get(url)
+        self.assertTemplateNotUsed(response, 'post_item.html')
+        self.assertContains(response, 'Редактировать')
+        self.assertNotContains(response, 'Посмотреть запись')
+
+        response = self.unauthorized_client.get(url)
+        self.assertNotContains(response, 'Редактировать')
+
+        self.authorized_client.post(self.edit_url, {'text': 'card text'})
+        response = self.authorized_client.get(url)
+        self.assertTemplateUsed(response, 'post_item.html')
+        self.assertContains(response, 'card text')
 
     def test_follow(self):
         followers = self.user2.following.count()
@@ -192,3 +232,356 @@ class StaticViewTests(TestCase):
         post_url = reverse('post', args=[self.user, self.new_post.id])
         response = self.authorized_client.get(post_url)
         self.assertContains(response, 'comment for post')
+
+
+@override_settings(JOBS_ASYNC=True)
+class WriteTransactionTests(TestCase):
+    """Запись и её фоновые задачи фиксируются вместе."""
+
+    def test_failed_request_rolls_back_row_and_jobs(self):
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(text='text', author=author)
+        Job.objects.all().delete()
+        self.client.force_login(author)
+        with mock.patch('posts.views.messages.warning',
+                        side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            self.client.post(reverse('add_comment', args=['author', post.pk]),
+                             {'text': 'comment'})
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Job.objects.exists())
+
+        self.client.post(reverse('add_comment', args=['author', post.pk]),
+                         {'text': 'comment'})
+        self.assertTrue(Comment.objects.exists())
+        self.assertTrue(Job.objects.exists())
+
+
+class FeedQueriesTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.group = Group.objects.create(title='group', slug='group',
+                                         description='group')
+        cls.urls = [reverse('index'),
+                    reverse('group_posts', args=[cls.group.slug]),
+                    reverse('profile', args=[cls.author.username]),
+                    reverse('follow_index')]
+
+    def create_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(text=f'text {i}', author=self.author,
+                                       group=self.group)
+            post.comments.create(author=self.reader, text='comment')
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.reader_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_feed_query_count_does_not_depend_on_page_size(self):
+        self.create_posts(1)
+        single = {url: self.count_queries(url) for url in self.urls}
+        self.create_posts(9)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), single[url])
+
+
+@override_settings(FEED_PAGINATION='cursor')
+class CursorPaginationTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.posts = [Post.objects.create(text=f'text {i}', author=cls.user)
+                     for i in range(25)]
+
+    def walk(self, url):
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(url, {'cursor': cursor or ''})
+            page = response.context['page']
+            seen.extend(post.id for post in page)
+            cursor = page.next_cursor
+            if cursor is None:
+                return seen, page
+
+    def test_cursor_walk_returns_every_post_once(self):
+        seen, _ = self.walk(reverse('index'))
+        expected = [post.id for post in reversed(self.posts)]
+        self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_previous_page(self):
+        first = self.client.get(reverse('index')).context['page']
+        second = self.client.get(reverse('index'),
+                                 {'cursor': first.next_cursor})
+        second = second.context['page']
+        back = self.client.get(reverse('index'),
+                               {'cursor': second.previous_cursor})
+        self.assertEqual([post.id for post in back.context['page']],
+                         [post.id for post in first])
+        self.assertFalse(back.context['page'].has_previous())
+
+    def test_deep_page_costs_the_same_as_first(self):
+        first = self.client.get(reverse('index')).context['page']
+        second = self.client.get(reverse('index'),
+                                 {'cursor': first.next_cursor})
+        cursor = second.context['page'].next_cursor
+        with CaptureQueriesContext(connection) as first_page:
+            self.client.get(reverse('index'))
+        with CaptureQueriesContext(connection) as deep_page:
+            self.client.get(reverse('index'), {'cursor': cursor})
+        self.assertEqual(len(first_page), len(deep_page))
+        for query in deep_page.captured_queries:
+            self.assertNotIn('COUNT(*)', query['sql'])
+            self.assertNotIn('OFFSET', query['sql'])
+
+    def test_broken_cursor_returns_first_page(self):
+        response = self.client.get(reverse('index'), {'cursor': 'broken'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page'][0].id, self.posts[-1].id)
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Путешествия',
+                                         slug='travel',
+                                         description='Заметки о поездках')
+        cls.post_text = Post.objects.create(
+            text='Путешествия по горам Кавказа', author=cls.user)
+        cls.post_group = Post.objects.create(
+            text='Фотографии с отпуска', author=cls.user, group=cls.group)
+        cls.post_other = Post.objects.create(
+            text='Рецепт борща', author=cls.user)
+
+    def search(self, query, url=None):
+        response = self.client.get(url or reverse('index'),
+                                   {'search': query})
+        return [post.id for post in response.context['page']]
+
+    def test_search_finds_post_text_and_group(self):
+        found = self.search('путешествия')
+        self.assertEqual(set(found), {self.post_text.id, self.post_group.id})
+
+    def test_text_match_ranks_above_group_match(self):
+        found = self.search('путешествия')
+        self.assertEqual(found[0], self.post_text.id)
+
+    def test_search_matches_word_prefix(self):
+        self.assertEqual(self.search('борщ'), [self.post_other.id])
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.create(text='Рецепт солянки', author=self.user)
+        post.text = 'Рецепт окрошки'
+        post.save()
+        self.assertEqual(self.search('солянки'), [])
+        self.assertEqual(self.search('окрошки'), [post.id])
+        post.delete()
+        self.assertEqual(self.search('окрошки'), [])
+
+    def test_search_in_group_feed(self):
+        url = reverse('group_posts', args=[self.group.slug])
+        self.assertEqual(self.search('отпуска', url), [self.post_group.id])
+        self.assertEqual(self.search('борща', url), [])
+
+
+@override_settings(FOLLOW_TIMELINES=True, TIMELINE_FANOUT_LIMIT=1)
+class FollowTimelineTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.other_reader = User.objects.create_user(username='other')
+        cls.author = User.objects.create_user(username='author')
+        cls.celebrity = User.objects.create_user(username='celebrity')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def feed(self):
+        response = self.client.get(reverse('follow_index'))
+        return [post.text for post in response.context['page']]
+
+    def test_new_post_is_pushed_to_built_timeline(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.feed(), [])
+        Post.objects.create(text='new', author=self.author)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.feed(), ['new'])
+        for query in context.captured_queries:
+            self.assertNotIn('"posts_post" INNER JOIN "posts_follow"',
+                             query['sql'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        Post.objects.create(text='old', author=self.author)
+        self.assertEqual(self.feed(), [])
+        self.client.get(reverse('profile_follow', args=['author']))
+        self.assertEqual(self.feed(), ['old'])
+        self.client.get(reverse('profile_unfollow', args=['author']))
+        self.assertEqual(self.feed(), [])
+
+    def test_celebrity_posts_are_merged_on_read(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.celebrity)
+        Follow.objects.create(user=self.other_reader, author=self.celebrity)
+        self.feed()
+        Post.objects.create(text='author', author=self.author)
+        Post.objects.create(text='celebrity', author=self.celebrity)
+        self.assertEqual(self.feed(), ['celebrity', 'author'])
+
+    def test_interleaved_pushes_keep_both_posts(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.feed()
+        first, second = [Post(text=text, author=self.author)
+                         for text in ('first', 'second')]
+        with mock.patch.object(timelines.push_post, 'enqueue'):
+            Post.objects.bulk_create([first, second])
+        first, second = Post.objects.order_by('pk')
+        merge = timelines._merge
+
+        def push_second_while_merging(*args):
+            # Вторая рассылка приходит, пока первая держит ленту.
+            with mock.patch.object(timelines, 'LOCK_WAIT', 0), \
+                    self.assertRaises(timelines.TimelineBusy):
+                timelines.push_post(second.pk)
+            return merge(*args)
+
+        with mock.patch.object(timelines, '_merge',
+                               push_second_while_merging):
+            timelines.push_post(first.pk)
+        # Очередь повторяет упавшую задачу.
+        timelines.push_post(second.pk)
+        self.assertEqual(self.feed(), ['second', 'first'])
+
+    def test_former_celebrity_timelines_are_rebuilt(self):
+        Follow.objects.create(user=self.reader, author=self.celebrity)
+        Follow.objects.create(user=self.other_reader, author=self.celebrity)
+        Post.objects.create(text='celebrity', author=self.celebrity)
+        self.assertEqual(self.feed(), ['celebrity'])
+        Follow.objects.filter(user=self.other_reader).delete()
+        self.assertEqual(self.feed(), ['celebrity'])
+
+    def test_rebuild_command(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(text='post', author=self.author)
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertIsNotNone(cache.get(f'timeline:{self.reader.pk}'))
+        self.assertEqual(self.feed(), ['post'])
+
+
+class FragmentCacheTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='group', slug='group',
+                                         description='group')
+        cls.other_group = Group.objects.create(title='other', slug='other',
+                                               description='other')
+        cls.post = Post.objects.create(text='post body', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.client.force_login(self.reader)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    def test_pages_work_without_cache(self):
+        """Недоступный кеш означает промахи, а не ошибку."""
+        for url in (reverse('index'),
+                    reverse('post', args=['author', self.post.id]),
+                    reverse('profile', args=['author'])):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'post body')
+
+    def test_feed_reads_card_versions_in_one_call(self):
+        for number in range(4):
+            Post.objects.create(text=f'post {number}', author=self.author)
+        self.client.get(reverse('index'))
+        caching.invalidate('feed:index')
+        versions = mock.Mock(wraps=cache)
+        cards = mock.Mock(wraps=cache)
+        with mock.patch('posts.caching.cache', versions), \
+                mock.patch('posts.templatetags.post_filters.cache', cards):
+            response = self.client.get(reverse('index'))
+        self.assertTemplateNotUsed(response, 'post_item.html')
+        card_calls = [keys for (keys,), _ in versions.get_many.call_args_list
+                      if f'version:post:{self.post.pk}' in keys]
+        self.assertEqual(len(card_calls), 1)
+        self.assertEqual(len(card_calls[0]), 5)
+        versions.get.assert_not_called()
+        cards.get.assert_not_called()
+        self.assertEqual(cards.get_many.call_count, 1)
+
+    def test_anonymous_and_author_variants_are_separate(self):
+        edit_url = reverse('post_edit', args=['author', self.post.id])
+        self.assertContains(self.author_client.get(reverse('index')),
+                            edit_url)
+        self.assertNotContains(Client().get(reverse('index')), edit_url)
+        self.assertNotContains(self.client.get(reverse('index')), edit_url)
+
+    def test_post_edit_invalidates_only_affected_feeds(self):
+        index = caching.version('feed:index')
+        old_group = caching.version(f'feed:group:{self.group.pk}')
+        new_group = caching.version(f'feed:group:{self.other_group.pk}')
+        reader_feed = caching.version(f'feed:profile:{self.reader.pk}')
+
+        self.author_client.post(
+            reverse('post_edit', args=['author', self.post.id]),
+            {'text': 'edited', 'group': self.other_group.pk})
+
+        self.assertNotEqual(caching.version('feed:index'), index)
+        self.assertNotEqual(
+            caching.version(f'feed:group:{self.group.pk}'), old_group)
+        self.assertNotEqual(
+            caching.version(f'feed:group:{self.other_group.pk}'), new_group)
+        self.assertEqual(
+            caching.version(f'feed:profile:{self.reader.pk}'), reader_feed)
+        response = self.client.get(
+            reverse('group_posts', args=[self.other_group.slug]))
+        self.assertContains(response, 'edited')
+
+    def test_comments_refresh_cached_card(self):
+        self.client.get(reverse('index'))
+        self.client.post(reverse('add_comment', args=['author', self.post.id]),
+                         {'text': 'comment'})
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'Комментариев: 1')
+        comment = self.post.comments.get()
+        self.client.get(reverse('delete_comment',
+                                args=['author', self.post.id, comment.id]))
+        response = self.client.get(reverse('index'))
+        self.assertNotContains(response, 'Комментариев:')
+
+    def test_follow_refreshes_follow_feed_and_profile_card(self):
+        profile_url = reverse('profile', args=['author'])
+        self.assertNotContains(self.client.get(reverse('follow_index')),
+                               'post body')
+        self.assertContains(self.client.get(profile_url), 'Подписчиков: 0')
+        self.client.get(reverse('profile_follow', args=['author']))
+        self.assertContains(self.client.get(reverse('follow_index')),
+                            'post body')
+        self.assertContains(self.client.get(profile_url), 'Подписчиков: 1')
+        self.client.get(reverse('profile_unfollow', args=['author']))
+        self.assertContains(self.client.get(profile_url), 'Подписчиков: 0')
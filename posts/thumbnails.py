@@ -0,0 +1,115 @@
+"""Заранее подготовленные миниатюры изображений постов.
+
+После сохранения поста с новым изображением миниатюры всех ширин из
+settings.THUMBNAIL_WIDTHS строятся в JPEG и WebP фоновой задачей
+(jobs.queue). Список вариантов с
+размерами записывается в Post.thumbnails, и шаблон выводит srcset без
+обращения к движку миниатюр. Пока миниатюры не готовы, показывается
+исходное изображение.
+"""
+import hashlib
+import json
+import logging
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps, features
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from jobs.queue import task
+from yatube.metrics import THUMBNAIL_TIME
+
+from . import caching
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'jpeg': 'jpg', 'webp': 'webp'}
+
+
+def _formats():
+    if features.check('webp'):
+        return FORMATS
+    return {'jpeg': FORMATS['jpeg']}
+
+
+def _height(width):
+    ratio_width, ratio_height = settings.THUMBNAIL_ASPECT
+    return round(width * ratio_height / ratio_width)
+
+
+def _encode(image, fmt):
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        image = image.convert('RGBA')
+        background.paste(image, mask=image.split()[-1])
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, fmt.upper(), quality=settings.THUMBNAIL_QUALITY)
+    return buffer.getvalue()
+
+
+def render_variants(post_id, image_name):
+    """Построить миниатюры и вернуть описание вариантов.
+
+    Возвращает (ширина, высота исходника, варианты), где варианты —
+    словарь формат -> список [ширина, высота, имя файла].
+    """
+    with default_storage.open(image_name) as source:
+        image = Image.open(source)
+        image.load()
+    width, height = image.size
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    prefix = hashlib.md5(image_name.encode()).hexdigest()[:8]
+    variants = {fmt: [] for fmt in _formats()}
+    for thumb_width in settings.THUMBNAIL_WIDTHS:
+        size = thumb_width, _height(thumb_width)
+        thumb = ImageOps.fit(image, size, Image.LANCZOS,
+                             centering=(0.5, 0.5))
+        for fmt, extension in _formats().items():
+            name = os.path.join(
+                settings.THUMBNAIL_DIR,
+                f'{post_id}-{prefix}-{thumb_width}.{extension}')
+            # При повторном построении хранилище добавило бы к занятому
+            # имени суффикс, а прежний файл остался бы без ссылок.
+            default_storage.delete(name)
+            name = default_storage.save(name,
+                                        ContentFile(_encode(thumb, fmt)))
+            variants[fmt].append([size[0], size[1], name])
+    return width, height, variants
+
+
+def delete_variants(thumbnails):
+    for variants in json.loads(thumbnails or '{}').values():
+        for _, _, name in variants:
+            default_storage.delete(name)
+
+
+@task(after_commit=True)
+def generate(post_id, image_name):
+    """Построить миниатюры поста, если изображение не успело смениться."""
+    try:
+        with THUMBNAIL_TIME.time():
+            width, height, variants = render_variants(post_id, image_name)
+    except (OSError, ValueError):
+        logger.exception('Cannot build thumbnails for post %s', post_id)
+        return
+    updated = Post.objects.filter(pk=post_id, image=image_name).update(
+        image_width=width, image_height=height,
+        thumbnails=json.dumps(variants), updated=timezone.now())
+    if not updated:
+        delete_variants(json.dumps(variants))
+        return
+    post = Post.objects.filter(pk=post_id).only(
+        'author_id', 'group_id').first()
+    if post is not None:
+        caching.invalidate_post(post)
+
+
+def schedule(post):
+    """Поставить построение миниатюр в очередь вместе с сохранением поста."""
+    generate.enqueue(post.pk, post.image.name)
@@ -0,0 +1,168 @@
+"""Готовые ленты подписок (fan-out on write).
+
+Для каждого подписчика в кеше хранится ограниченный список записей
+(время публикации, id поста, id автора), новые сверху. Новый пост
+дописывается в ленты всех подписчиков автора, подписка и отписка
+дополняют или чистят ленту. follow_index читает готовый список id
+вместо соединения Post с Follow.
+
+Посты авторов, у которых больше settings.TIMELINE_FANOUT_LIMIT
+подписчиков, не рассылаются: они подмешиваются при чтении.
+Если ленты нет в кеше, она собирается из базы при первом обращении.
+
+Рассылка поста, дополнение ленты после подписки и чистка после
+отписки выполняются фоновыми задачами (jobs.queue).
+
+Лента меняется чтением, слиянием и записью под блокировкой на ключе
+timeline-lock:<user_id> (cache.add), иначе одновременная запись двух
+постов в одну ленту теряла бы один из них. Если блокировку не удалось
+взять за LOCK_WAIT секунд, задача падает с TimelineBusy и повторяется
+очередью. Когда автор перестаёт быть «звездой», ленты его подписчиков
+удаляются и собираются заново: его посты больше не подмешиваются при
+чтении, а в готовых лентах их нет.
+"""
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+from jobs.queue import task
+from users.models import Profile
+
+from .models import Follow, Post
+
+
+# Сколько секунд живёт блокировка ленты, если её владелец упал, и
+# сколько её ждать.
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2
+
+
+class TimelineBusy(Exception):
+    """Ленту дольше LOCK_WAIT секунд меняет другой процесс."""
+
+
+def _key(user_id):
+    return f'timeline:{user_id}'
+
+
+def _entry(post):
+    return post.pub_date.timestamp(), post.pk, post.author_id
+
+
+def _entries(posts):
+    return [(pub_date.timestamp(), pk, author_id) for pub_date, pk, author_id
+            in posts.values_list('pub_date', 'pk', 'author_id')
+            [:settings.TIMELINE_LENGTH]]
+
+
+def _merge(*timelines):
+    merged = sorted({entry for timeline in timelines for entry in timeline},
+                    reverse=True)
+    return merged[:settings.TIMELINE_LENGTH]
+
+
+def _store(user_id, timeline):
+    cache.set(_key(user_id), timeline, settings.TIMELINE_TTL)
+
+
+@contextmanager
+def _locked(user_id):
+    key = f'timeline-lock:{user_id}'
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(key, 1, LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            raise TimelineBusy(user_id)
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
+def _update(user_id, change):
+    """Заменить уже собранную ленту на change(лента) под блокировкой."""
+    with _locked(user_id):
+        timeline = cache.get(_key(user_id))
+        if timeline is not None:
+            _store(user_id, change(timeline))
+
+
+def celebrity_ids(author_ids):
+    """Авторы из author_ids, чьи посты не рассылаются по лентам."""
+    return set(Profile.objects.filter(
+        user__in=author_ids,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('user', flat=True))
+
+
+def build(user):
+    """Собрать ленту пользователя из базы и сохранить в кеш."""
+    followed = Follow.objects.filter(user=user).values('author')
+    timeline = _entries(
+        Post.objects.filter(author__in=followed)
+        .exclude(author__in=celebrity_ids(followed))
+        .order_by('-pub_date', '-pk')
+    )
+    _store(user.pk, timeline)
+    return timeline
+
+
+def post_ids(user):
+    """Id постов ленты подписок, новые сверху."""
+    timeline = cache.get(_key(user.pk))
+    if timeline is None:
+        timeline = build(user)
+    celebrities = celebrity_ids(
+        Follow.objects.filter(user=user).values('author'))
+    if celebrities:
+        timeline = _merge(timeline, _entries(
+            Post.objects.filter(author__in=celebrities)
+            .order_by('-pub_date', '-pk')
+        ))
+    return [pk for _, pk, _ in timeline]
+
+
+@task()
+def push_post(post_id):
+    """Разослать новый пост по уже собранным лентам подписчиков."""
+    post = Post.objects.filter(pk=post_id).only('pub_date',
+                                                'author_id').first()
+    if post is None or celebrity_ids([post.author_id]):
+        return
+    follower_ids = Follow.objects.filter(
+        author=post.author_id).values_list('user_id', flat=True)
+    keys = {_key(user_id): user_id for user_id in follower_ids}
+    entry = _entry(post)
+    for key in cache.get_many(list(keys)):
+        _update(keys[key], lambda timeline: _merge(timeline, [entry]))
+
+
+@task()
+def follow(user_id, author_id):
+    """Дополнить ленту постами нового автора, если подписка ещё есть."""
+    if cache.get(_key(user_id)) is None or not Follow.objects.filter(
+            user=user_id, author=author_id).exists():
+        return
+    entries = _entries(Post.objects.filter(author=author_id)
+                       .order_by('-pub_date', '-pk'))
+    _update(user_id, lambda timeline: _merge(timeline, entries))
+
+
+@task()
+def unfollow(user_id, author_id):
+    """Убрать из ленты посты автора, если подписка не появилась снова."""
+    if cache.get(_key(user_id)) is not None and not Follow.objects.filter(
+            user=user_id, author=author_id).exists():
+        _update(user_id, lambda timeline: [
+            entry for entry in timeline if entry[2] != author_id])
+
+
+@task()
+def reset_followers(author_id):
+    """Удалить ленты подписчиков автора, чтобы они собрались заново."""
+    for user_id in Follow.objects.filter(
+            author=author_id).values_list('user_id', flat=True):
+        with _locked(user_id):
+            cache.delete(_key(user_id))
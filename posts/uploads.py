@@ -0,0 +1,131 @@
+"""Обработка изображений, загружаемых к постам.
+
+Файл пишется на диск по частям (HashingUploadHandler), по дороге
+считается его sha256 и размер, так что даже большой снимок не
+держится в памяти целиком. Затем PostForm.clean_image вызывает
+process_image:
+
+* проверяет размер в байтах и, по заголовку, число пикселей — до
+  декодирования всего изображения;
+* поворачивает снимок по EXIF и перекодирует его без метаданных,
+  уменьшив до settings.IMAGE_MASTER_SIZE по большей стороне;
+* называет результат по хешу исходного файла, поэтому одинаковые
+  загрузки хранятся один раз.
+"""
+import hashlib
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+
+from yatube.metrics import UPLOAD_SIZE
+
+# Каталог изображений постов, совпадает с Post.image.upload_to.
+UPLOAD_DIR = 'posts/'
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png'}
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл и считает её sha256."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+def _sha256(file):
+    digest = getattr(file, 'sha256', None)
+    if digest is None:
+        hasher = hashlib.sha256()
+        for chunk in file.chunks():
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+    file.seek(0)
+    return digest
+
+
+def _existing(digest):
+    for extension in EXTENSIONS.values():
+        name = os.path.join(UPLOAD_DIR, f'{digest}.{extension}')
+        if default_storage.exists(name):
+            return name
+    return None
+
+
+def _has_transparency(image):
+    if image.mode in ('RGBA', 'LA'):
+        return image.getextrema()[-1][0] < 255
+    return image.mode == 'P' and 'transparency' in image.info
+
+
+def _encode(image):
+    """Перекодировать изображение без метаданных: JPEG, а для
+    изображений с прозрачностью — PNG."""
+    buffer = BytesIO()
+    if _has_transparency(image):
+        image.convert('RGBA').save(buffer, 'PNG', optimize=True)
+        return buffer.getvalue(), 'PNG'
+    image.convert('RGB').save(buffer, 'JPEG',
+                              quality=settings.IMAGE_MASTER_QUALITY,
+                              optimize=True, progressive=True)
+    return buffer.getvalue(), 'JPEG'
+
+
+def process_image(file):
+    """Проверить и перекодировать загруженное изображение.
+
+    Возвращает имя уже сохранённого файла, если такое изображение
+    загружали раньше, иначе ContentFile с новым содержимым.
+    """
+    UPLOAD_SIZE.observe(file.size)
+    if file.size > settings.IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            'Файл слишком большой: не больше %(limit)s.',
+            code='file_too_large',
+            params={'limit': filesizeformat(settings.IMAGE_MAX_UPLOAD_SIZE)})
+
+    digest = _sha256(file)
+    existing = _existing(digest)
+    if existing is not None:
+        return existing
+
+    try:
+        image = Image.open(file)
+        width, height = image.size
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Изображение слишком большое: %(width)s×%(height)s '
+                'пикселей, допустимо не больше %(limit)s.',
+                code='image_too_large',
+                params={'width': width, 'height': height,
+                        'limit': settings.IMAGE_MAX_PIXELS})
+        # JPEG декодируется сразу в уменьшенном масштабе.
+        master_size = settings.IMAGE_MASTER_SIZE
+        image.draft('RGB', (master_size, master_size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((master_size, master_size), Image.LANCZOS)
+        content, fmt = _encode(image)
+    except (OSError, Image.DecompressionBombError) as error:
+        raise ValidationError(
+            'Загрузите правильное изображение. Файл, который вы загрузили, '
+            'поврежден или не является изображением.',
+            code='invalid_image') from error
+    finally:
+        file.seek(0)
+    return ContentFile(content, name=f'{digest}.{EXTENSIONS[fmt]}')
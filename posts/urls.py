@@ -6,6 +6,7 @@ urlpatterns = [
     path('group/<slug:slug>/', views.group_posts, name='group_posts'),
     path('new/', views.new_post, name='new_post'),
     path("follow/", views.follow_index, name="follow_index"),
+    path('popular/', views.popular, name='popular'),
     path('<str:username>/', views.profile_view, name='profile'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
     path('<str:username>/<int:post_id>/edit/', views.post_edit,
@@ -15,6 +16,8 @@ urlpatterns = [
 
     path("<str:username>/<int:post_id>/comment/", views.add_comment,
          name='add_comment'),
+    path('<str:username>/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
     path("<str:username>/<int:post_id>/<int:comment_id>/edit_comment/",
          views.edit_comment,
          name='edit_comment'),
@@ -1,49 +1,79 @@
+from django.conf import settings
 from django.contrib import messages
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from yatube.concurrency import run_concurrently
+from yatube.edge import edge_cache
 from .models import Post, Group, Follow, Comment
 from .forms import PostForm, CommentForm
+from .conditional import (conditional_page, follow_state, group_state,
+                          index_state, popular_state, post_state,
+                          profile_state)
+from . import caching, timelines
+from .feeds import feed_queryset
+from .popular import window_start
+from .pagination import (NEXT, CursorPaginator, paginate, paginate_ids,
+                         prefetch_tasks)
+from .search import search_posts
 
 User = get_user_model()
 
 
+@edge_cache
+@conditional_page(index_state)
 def index(request):
     search_query = request.GET.get('search', '')
+    posts = feed_queryset()
     if search_query:
-        posts = Post.objects.filter(text__icontains=search_query)
-    else:
-        posts = Post.objects.all()
-    paginator = Paginator(posts, 10)
-    page_num = request.GET.get('page', 1)
-    page = paginator.get_page(page_num)
-    return render(request, 'index.html', {'page': page,
-                                          'paginator': paginator,
-                                          'search_query': search_query,
-                                          })
+        posts = search_posts(posts, search_query)
+    paginator, page = paginate(request, posts)
+    return render(request, 'index.html', {
+        'page': page,
+        'paginator': paginator,
+        'search_query': search_query,
+        'feed_version': caching.version('feed:index'),
+    })
+
+
+@edge_cache
+@conditional_page(popular_state)
+def popular(request):
+    """Посты по рейтингу из posts.popular, лучшие первыми."""
+    posts = feed_queryset(
+        popularity__isnull=False,
+        pub_date__gte=window_start(),
+    ).order_by('-popularity__score', '-pk')
+    paginator, page = paginate(request, posts, keyset=False)
+    return render(request, 'popular.html', {
+        'page': page,
+        'paginator': paginator,
+        'feed_version': caching.version('feed:popular'),
+    })
 
 
+@edge_cache
+@conditional_page(group_state)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     search_query = request.GET.get('search', '')
+    posts = feed_queryset(group=group)
     if search_query:
-        posts = Post.objects.filter(text__icontains=search_query,
-                                    group=group)
-    else:
-        posts = group.group_posts.all()
-    paginator = Paginator(posts, 10)
-    page_num = request.GET.get('page', 1)
-    page = paginator.get_page(page_num)
+        posts = search_posts(posts, search_query)
+    paginator, page = paginate(request, posts)
     context = {"group": group,
                "page": page,
                'paginator': paginator,
                'search_query': search_query,
+               'feed_version': caching.version(f'feed:group:{group.pk}'),
                }
     return render(request, "group.html", context)
 
 
 @login_required
+@transaction.atomic
 def new_post(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if request.method == "POST":
@@ -57,42 +87,92 @@ def new_post(request):
                                              })
 
 
+@edge_cache
+@conditional_page(profile_state)
 def profile_view(request, username):
-    user = get_object_or_404(User, username=username)
-    posts = user.posts.all()
-    paginator = Paginator(posts, 10)
-    page_num = request.GET.get('page', 1)
-    page = paginator.get_page(page_num)
-    if request.user.is_authenticated:
-        following = user.following.filter(user=request.user)
-    else:
-        following = ''
-    return render(request, 'profile.html', {'author': user,
-                                            'posts': page,
-                                            'paginator': paginator,
-                                            'following': following,
-                                            })
+    user = get_object_or_404(User.objects.select_related('profile'),
+                             username=username)
+    posts = feed_queryset(author=user)
+    profile = getattr(user, 'profile', None)
+    paginator, page = paginate(request, posts,
+                               count=profile and profile.posts_count)
+    reader = request.user if request.user.is_authenticated else None
+    following, *_ = run_concurrently(
+        lambda: reader is not None and user.following.filter(
+            user=reader).exists(),
+        *prefetch_tasks(page),
+    )
+    return render(request, 'profile.html', {
+        'author': user,
+        'posts': page,
+        'paginator': paginator,
+        'following': following,
+        'feed_version': caching.version(f'feed:profile:{user.pk}'),
+    })
+
+
+def _comment_paginator(post_id):
+    return CursorPaginator(
+        Comment.objects.filter(post=post_id).select_related('author'),
+        settings.COMMENTS_PER_PAGE, field='created')
 
 
+@conditional_page(post_state)
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, id=post_id,
-                             author__username=username)
-    comments = post.comments.all()
+    reader = request.user if request.user.is_authenticated else None
+    paginator = _comment_paginator(post_id)
+    cursor = request.GET.get('cursor')
+    comments = paginator.chunk(cursor)
+    post, following, _ = run_concurrently(
+        lambda: get_object_or_404(
+            feed_queryset().select_related('author__profile'),
+            id=post_id, author__username=username),
+        lambda: reader is not None and Follow.objects.filter(
+            author__username=username, user=reader).exists(),
+        lambda: len(comments),
+    )
+    # Без курсора известно, сколько всего комментариев, и ссылка на
+    # следующую порцию не показывается, если её нет.
+    more = len(comments) == paginator.per_page and (
+        cursor or post.comment_count > paginator.per_page)
     form = CommentForm(request.POST)
-    if request.user.is_authenticated:
-        following = post.author.following.filter(user=request.user)
-    else:
-        following = ''
-    return render(request, 'post.html', {'post': post,
-                                         'author': post.author,
-                                         'comments': comments,
-                                         'form': form,
-                                         'show': True,
-                                         'following': following,
-                                         })
+    return render(request, 'post.html', {
+        'post': post,
+        'author': post.author,
+        'comments': comments,
+        'comments_next': (paginator.encode(NEXT, list(comments)[-1])
+                          if more else None),
+        'form': form,
+        'following': following,
+    })
+
+
+def post_comments(request, username, post_id):
+    """Следующая порция комментариев: HTML для кнопки «Показать ещё»
+    или JSON при format=json."""
+    post = get_object_or_404(Post.objects.select_related('author'),
+                             id=post_id, author__username=username)
+    page = _comment_paginator(post_id).get_page(request.GET.get('cursor'))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [{
+                'id': comment.pk,
+                'author': comment.author.username,
+                'text': comment.text,
+                'created': comment.created.isoformat(),
+                'updated': comment.updated.isoformat(),
+            } for comment in page],
+            'next_cursor': page.next_cursor,
+        })
+    return render(request, 'comments_chunk.html', {
+        'post': post,
+        'comments': page,
+        'comments_next': page.next_cursor,
+    })
 
 
 @login_required
+@transaction.atomic
 def post_edit(request, username, post_id):
     post = get_object_or_404(Post, id=post_id,
                              author__username=username)
@@ -112,6 +192,7 @@ def post_edit(request, username, post_id):
 
 
 @login_required
+@transaction.atomic
 def post_delete(request, username, post_id):
     post = get_object_or_404(Post, id=post_id,
                              author__username=username)
@@ -125,6 +206,7 @@ def post_delete(request, username, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, username, post_id):
     post = get_object_or_404(Post, author__username=username,
                              id=post_id)
@@ -140,10 +222,13 @@ def add_comment(request, username, post_id):
 
 
 @login_required
+@transaction.atomic
 def edit_comment(request, username, post_id, comment_id):
     comment = get_object_or_404(Comment, id=comment_id,
                                 post__id=post_id,
                                 post__author__username=username)
+    comment.post = get_object_or_404(
+        feed_queryset().select_related('author__profile'), id=post_id)
     form = CommentForm(request.POST or None, instance=comment)
     if request.user != comment.author:
         return redirect('post', username=comment.post.author,
@@ -163,6 +248,7 @@ def edit_comment(request, username, post_id, comment_id):
 
 
 @login_required
+@transaction.atomic
 def delete_comment(request, username, post_id, comment_id):
     comment = get_object_or_404(Comment, id=comment_id)
     if request.user != comment.author:
@@ -173,25 +259,28 @@ def delete_comment(request, username, post_id, comment_id):
 
 
 @login_required
+@conditional_page(follow_state)
 def follow_index(request):
     search_query = request.GET.get('search', '')
-    if search_query:
-        posts = Post.objects.filter(text__icontains=search_query,
-                                    author__following__user=request.user
-                                    )
+    if settings.FOLLOW_TIMELINES and not search_query:
+        paginator, page = paginate_ids(request,
+                                       timelines.post_ids(request.user),
+                                       feed_queryset())
     else:
-        posts = Post.objects.filter(
-            author__following__user=request.user)
-    paginator = Paginator(posts, 10)
-    page_num = request.GET.get('page', 1)
-    page = paginator.get_page(page_num)
-    return render(request, "follow.html", {'page': page,
-                                           'paginator': paginator,
-                                           'search_query': search_query,
-                                           })
+        posts = feed_queryset(author__following__user=request.user)
+        if search_query:
+            posts = search_posts(posts, search_query)
+        paginator, page = paginate(request, posts)
+    return render(request, "follow.html", {
+        'page': page,
+        'paginator': paginator,
+        'search_query': search_query,
+        'feed_version': caching.follow_feed_version(request.user.pk),
+    })
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     user = get_object_or_404(User, username=username)
     if user != request.user:
@@ -200,6 +289,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     user = get_object_or_404(User, username=username)
     if user != request.user:
@@ -1,4 +1,12 @@
+import pytest
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    """Загруженные в тестах файлы и их миниатюры не попадают в media/."""
+    settings.MEDIA_ROOT = str(tmp_path)
@@ -1,3 +1,12 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Profile
+
+
+@admin.register(Profile)
+class ProfileAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'followers_count', 'following_count',
+                    'posts_count')
+    search_fields = ('user__username',)
+    readonly_fields = ('followers_count', 'following_count', 'posts_count')
+    raw_id_fields = ('user',)
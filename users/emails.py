@@ -0,0 +1,31 @@
+"""Письма пользователям. Отправляются фоновой задачей (jobs.queue),
+чтобы запрос не ждал почтового сервера."""
+from django.contrib.auth.forms import PasswordResetForm
+from django.core.mail import EmailMultiAlternatives
+from django.template import loader
+
+from jobs.queue import task
+
+
+@task(after_commit=True)
+def send_email(subject, body, to, html_body=None):
+    message = EmailMultiAlternatives(subject, body, to=to)
+    if html_body is not None:
+        message.attach_alternative(html_body, 'text/html')
+    message.send()
+
+
+class QueuedPasswordResetForm(PasswordResetForm):
+    """Сброс пароля, письмо которого собирается сразу, а отправляется
+    в фоне."""
+
+    def send_mail(self, subject_template_name, email_template_name,
+                  context, from_email, to_email,
+                  html_email_template_name=None):
+        subject = ''.join(loader.render_to_string(
+            subject_template_name, context).splitlines())
+        body = loader.render_to_string(email_template_name, context)
+        html_body = (loader.render_to_string(html_email_template_name,
+                                             context)
+                     if html_email_template_name else None)
+        send_email.enqueue(subject, body, [to_email], html_body)
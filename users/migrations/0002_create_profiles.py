@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(queryset, field, outer_field):
+    # То же выражение, что в команде reconcile_counters.
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef(outer_field)})
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def create_profiles(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Profile = apps.get_model('users', 'Profile')
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    Profile.objects.bulk_create(
+        [Profile(user=user)
+         for user in User.objects.filter(profile__isnull=True).iterator()],
+        batch_size=1000,
+    )
+    Profile.objects.update(
+        followers_count=count_of(Follow.objects, 'author', 'user'),
+        following_count=count_of(Follow.objects, 'user', 'user'),
+        posts_count=count_of(Post.objects, 'author', 'user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        ('posts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_profiles, migrations.RunPython.noop),
+    ]
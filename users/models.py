@@ -1,3 +1,20 @@
+from django.contrib.auth import get_user_model
 from django.db import models
 
-# Create your models here.
+User = get_user_model()
+
+
+class Profile(models.Model):
+    """Счётчики пользователя, которые показываются в карточке профиля.
+
+    Поля меняются только через F-выражения в сигналах posts.signals,
+    расхождения исправляет команда reconcile_counters.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                related_name='profile')
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    posts_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'Profile of {self.user}'
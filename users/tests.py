@@ -1,3 +1,45 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.db import DatabaseError
 from django.test import TestCase
+from django.urls import reverse
+
+from jobs import queue
+from users import views
+
+User = get_user_model()
+
+
+@mock.patch.object(queue.transaction, 'on_commit',
+                   side_effect=lambda func: func())
+class EmailTests(TestCase):
+
+    def test_signup_sends_welcome_email(self, on_commit):
+        response = self.client.post(reverse('signup'), {
+            'username': 'reader', 'email': 'reader@example.com',
+            'password1': 'Sup3r-secret!', 'password2': 'Sup3r-secret!'})
+        self.assertRedirects(response, reverse('login'))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['reader@example.com'])
+        self.assertIn('reader', mail.outbox[0].body)
+        on_commit.assert_called()
+
+    def test_failed_enqueue_rolls_back_signup(self, on_commit):
+        with mock.patch.object(views.send_email, 'enqueue',
+                               side_effect=DatabaseError), \
+                self.assertRaises(DatabaseError):
+            self.client.post(reverse('signup'), {
+                'username': 'reader', 'email': 'reader@example.com',
+                'password1': 'Sup3r-secret!', 'password2': 'Sup3r-secret!'})
+        self.assertFalse(User.objects.filter(username='reader').exists())
 
-# Create your tests here.
+    def test_password_reset_email(self, on_commit):
+        User.objects.create_user(username='reader', password='secret',
+                                 email='reader@example.com')
+        self.client.post(reverse('password_reset'),
+                         {'email': 'reader@example.com'})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('/auth/reset/', mail.outbox[0].body)
+        on_commit.assert_called()
@@ -3,4 +3,6 @@ from . import views
 
 urlpatterns = [
     path('signup/', views.SignUp.as_view(), name='signup'),
+    path('password_reset/', views.PasswordReset.as_view(),
+         name='password_reset'),
 ]
@@ -1,5 +1,9 @@
+from django.contrib.auth.views import PasswordResetView
+from django.db import transaction
+from django.template.loader import render_to_string
 from django.views.generic import CreateView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from .emails import QueuedPasswordResetForm, send_email
 from .forms import CreationForm
 
 
@@ -7,3 +11,20 @@ class SignUp(CreateView):
     form_class = CreationForm
     success_url = reverse_lazy("login")
     template_name = "signup.html"
+
+    @transaction.atomic
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        user = self.object
+        if user.email:
+            send_email.enqueue('Добро пожаловать в Yatube', render_to_string(
+                'emails/welcome.txt', {
+                    'user': user,
+                    'login_url': self.request.build_absolute_uri(
+                        reverse('login')),
+                }), [user.email])
+        return response
+
+
+class PasswordReset(PasswordResetView):
+    form_class = QueuedPasswordResetForm
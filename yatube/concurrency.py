@@ -0,0 +1,63 @@
+"""Параллельное выполнение независимых запросов к базе.
+
+Django 2.2 не умеет асинхронных представлений, поэтому независимые
+запросы одной страницы (срез ленты, COUNT, проверка подписки)
+выполняются в общем пуле потоков, у каждого из которых своё соединение
+с базой. Результаты возвращаются в порядке переданных функций,
+исключения пробрасываются вызывающему.
+
+Параллельность включается настройкой CONCURRENT_QUERIES. Внутри
+транзакции функции выполняются по очереди: другие соединения не видят
+её незафиксированных изменений.
+
+В поток передаётся контекст вызывающего (contextvars): маршрутизация
+чтения по репликам и замеры PerformanceMiddleware продолжают работать.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextvars import copy_context
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from .middleware import instrument_connections
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.QUERY_THREADS,
+            thread_name_prefix='queries')
+    return _executor
+
+
+def enabled():
+    """Будут ли функции выполняться параллельно."""
+    return settings.CONCURRENT_QUERIES and not any(
+        connection.in_atomic_block for connection in connections.all())
+
+
+def _call(func):
+    try:
+        with instrument_connections():
+            return func()
+    finally:
+        # Соединение потока переживает задачу так же, как соединение
+        # воркера переживает запрос: по CONN_MAX_AGE.
+        close_old_connections()
+
+
+def run_concurrently(*funcs):
+    """Выполнить функции и вернуть список их результатов."""
+    if len(funcs) < 2 or not enabled():
+        return [func() for func in funcs]
+    executor = _get_executor()
+    futures = [executor.submit(copy_context().run, _call, func)
+               for func in funcs[1:]]
+    try:
+        first = funcs[0]()
+    finally:
+        wait(futures)
+    return [first, *(future.result() for future in futures)]
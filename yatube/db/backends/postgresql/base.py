@@ -0,0 +1,74 @@
+"""PostgreSQL с проверкой постоянных соединений и их метриками.
+
+Поверх стандартного бэкенда:
+
+* соединение, переживающее запрос (CONN_MAX_AGE), перед первым
+  запросом к базе в следующем HTTP-запросе проверяется (is_usable) и
+  при обрыве переоткрывается, а не падает на первом же SQL — как
+  CONN_HEALTH_CHECKS в новых версиях Django;
+* в метрики пишутся открытые и занятые соединения, время установки
+  соединения и неудачные проверки.
+"""
+import time
+
+from django.db.backends.postgresql import base
+
+from yatube import metrics
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    health_check_done = False
+    in_use = False
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    def get_new_connection(self, conn_params):
+        with metrics.DB_CONNECT_TIME.labels(self.alias).time():
+            return super().get_new_connection(conn_params)
+
+    def connect(self):
+        super().connect()
+        metrics.DB_CONNECTIONS_OPEN.labels(self.alias).inc()
+        # Только что открытое соединение проверять не нужно.
+        self.health_check_done = True
+
+    def _close(self):
+        try:
+            super()._close()
+        finally:
+            metrics.DB_CONNECTIONS_OPEN.labels(self.alias).dec()
+            self._release()
+
+    def _release(self):
+        if self.in_use:
+            self.in_use = False
+            metrics.DB_CONNECTIONS_IN_USE.labels(self.alias).dec()
+
+    def close_if_unusable_or_obsolete(self):
+        # Вызывается в начале и в конце каждого HTTP-запроса.
+        self._release()
+        if self.connection is not None:
+            self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
+
+    def close_if_health_check_failed(self):
+        if (self.connection is None or not self.health_check_enabled
+                or self.health_check_done):
+            return
+        start = time.monotonic()
+        if not self.is_usable():
+            metrics.DB_HEALTH_CHECK_FAILURES.labels(self.alias).inc()
+            self.close()
+        metrics.DB_HEALTH_CHECK_TIME.labels(self.alias).observe(
+            time.monotonic() - start)
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        cursor = super()._cursor(name)
+        if not self.in_use:
+            self.in_use = True
+            metrics.DB_CONNECTIONS_IN_USE.labels(self.alias).inc()
+        return cursor
@@ -0,0 +1,71 @@
+"""Микрокеш nginx перед Django.
+
+nginx хранит ответы анонимным посетителям на GET-запросы лент, групп,
+профилей и flatpages settings.EDGE_CACHE_SECONDS секунд: столько
+указывает s-maxage в Cache-Control, который ставит edge_cache.
+Посетители с cookie сессии или сообщений идут мимо кеша, а ответы
+вошедшим пользователям помечаются private. Браузеру отдаётся
+max-age=0, так что он каждый раз переспрашивает страницу по ETag.
+
+После записи purge() ставит фоновую задачу (jobs.queue), которая
+запрашивает затронутые страницы у внутреннего сервера nginx по адресу
+settings.EDGE_PURGE_URL. Этот сервер всегда
+идёт в Django и кладёт свежий ответ в общий кеш, поэтому изменение
+видно сразу, а не через TTL. Остальные адреса (следующие страницы
+лент, поиск) устаревают не дольше чем через EDGE_CACHE_SECONDS.
+"""
+import logging
+from functools import wraps
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils.cache import patch_cache_control
+
+from jobs.queue import task
+
+logger = logging.getLogger(__name__)
+
+
+def _shareable(request, response):
+    """Можно ли отдать ответ любому анонимному посетителю."""
+    return (request.method in ('GET', 'HEAD')
+            and response.status_code in (200, 304)
+            and not request.user.is_authenticated
+            and not response.cookies
+            and not getattr(get_messages(request), 'used', False))
+
+
+def edge_cache(view):
+    """Разрешить nginx кешировать ответы представления анонимам."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if not settings.EDGE_CACHE_SECONDS:
+            return response
+        if _shareable(request, response):
+            patch_cache_control(response, public=True, max_age=0,
+                                s_maxage=settings.EDGE_CACHE_SECONDS)
+        else:
+            patch_cache_control(response, private=True, max_age=0)
+        return response
+    return wrapper
+
+
+@task(max_attempts=1, after_commit=True)
+def refresh(paths):
+    """Запросить страницы у nginx мимо кеша, заменив их копии."""
+    for path in paths:
+        url = settings.EDGE_PURGE_URL.rstrip('/') + path
+        try:
+            with urlopen(url, timeout=settings.EDGE_PURGE_TIMEOUT) as page:
+                page.read()
+        except OSError:
+            logger.warning('Cannot refresh %s in the edge cache', url)
+
+
+def purge(*paths):
+    """Обновить страницы в кеше nginx после фиксации транзакции."""
+    if not settings.EDGE_PURGE_URL or not paths:
+        return
+    refresh.enqueue(list(dict.fromkeys(paths)))
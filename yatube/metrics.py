@@ -0,0 +1,139 @@
+"""Метрики Prometheus и страница /metrics.
+
+Под gunicorn каждый воркер — отдельный процесс, поэтому метрики пишутся
+в файлы каталога из переменной окружения PROMETHEUS_MULTIPROC_DIR
+(режим multiprocess библиотеки prometheus_client), а /metrics собирает
+их из всех процессов. Так ответ описывает весь сервис, какой бы воркер
+ни обработал запрос сборщика. Без этой переменной, например в
+runserver и тестах, метрики живут в памяти единственного процесса.
+
+Каталог очищается при старте gunicorn и при выходе воркера помечается
+в хуках из gunicorn.conf.py.
+"""
+import os
+
+from django.db import DatabaseError
+from django.db.models import Count, Min
+from django.http import HttpResponse
+from django.utils import timezone
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+from prometheus_client.core import GaugeMetricFamily
+
+REQUEST_LATENCY = Histogram(
+    'yatube_request_latency_seconds', 'Время ответа по представлениям',
+    ['view', 'method'],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+REQUEST_QUERIES = Histogram(
+    'yatube_request_db_queries', 'Число запросов к базе за один запрос',
+    ['view'], buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200))
+REQUEST_DB_TIME = Histogram(
+    'yatube_request_db_seconds', 'Время в базе за один запрос', ['view'],
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+RESPONSE_SIZE = Histogram(
+    'yatube_response_bytes', 'Размер ответа', ['view'],
+    buckets=(1024, 4096, 16384, 65536, 262144, 1048576))
+CACHE_REQUESTS = Counter(
+    'yatube_cache_requests_total', 'Чтения из кеша', ['result'])
+REQUESTS_IN_PROGRESS = Gauge(
+    'yatube_requests_in_progress', 'Запросы в обработке',
+    multiprocess_mode='livesum')
+
+THUMBNAIL_TIME = Histogram(
+    'yatube_thumbnail_seconds', 'Построение миниатюр одного изображения',
+    buckets=(.05, .1, .25, .5, 1, 2.5, 5, 10, 30))
+UPLOAD_SIZE = Histogram(
+    'yatube_upload_bytes', 'Размер загруженных изображений',
+    buckets=(65536, 262144, 1048576, 2097152, 5242880, 10485760))
+
+DB_CONNECTIONS_OPEN = Gauge(
+    'yatube_db_connections_open', 'Открытые соединения с базой', ['alias'],
+    multiprocess_mode='livesum')
+DB_CONNECTIONS_IN_USE = Gauge(
+    'yatube_db_connections_in_use',
+    'Соединения, занятые обрабатываемыми запросами', ['alias'],
+    multiprocess_mode='livesum')
+DB_CONNECT_TIME = Histogram(
+    'yatube_db_connect_seconds', 'Ожидание нового соединения с базой',
+    ['alias'], buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 5))
+DB_HEALTH_CHECK_TIME = Histogram(
+    'yatube_db_health_check_seconds',
+    'Проверка постоянного соединения перед повторным использованием',
+    ['alias'], buckets=(.0005, .001, .005, .01, .05, .1, .5))
+DB_HEALTH_CHECK_FAILURES = Counter(
+    'yatube_db_health_check_failures_total',
+    'Постоянные соединения, не прошедшие проверку', ['alias'])
+
+JOB_TIME = Histogram(
+    'yatube_job_seconds', 'Выполнение фоновой задачи', ['task'],
+    buckets=(.01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60))
+JOBS_FINISHED = Counter(
+    'yatube_jobs_finished_total',
+    'Завершённые попытки фоновых задач: done, error или failed, если '
+    'попытки кончились', ['task', 'result'])
+
+WORKERS = Gauge(
+    'yatube_gunicorn_workers', 'Работающие воркеры gunicorn',
+    multiprocess_mode='livesum')
+WORKER_EXITS = Counter(
+    'yatube_gunicorn_worker_exits_total', 'Завершения воркеров gunicorn')
+
+
+def observe_request(view, method, stats, elapsed, size):
+    """Записать замеры одного запроса (RequestStats из middleware)."""
+    REQUEST_LATENCY.labels(view, method).observe(elapsed)
+    REQUEST_QUERIES.labels(view).observe(stats.query_count)
+    REQUEST_DB_TIME.labels(view).observe(stats.db_time)
+    if size is not None:
+        RESPONSE_SIZE.labels(view).observe(size)
+    if stats.cache_hits:
+        CACHE_REQUESTS.labels('hit').inc(stats.cache_hits)
+    if stats.cache_misses:
+        CACHE_REQUESTS.labels('miss').inc(stats.cache_misses)
+
+
+def registry():
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if not path:
+        return REGISTRY
+    collected = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collected, path=path)
+    return collected
+
+
+class JobQueueCollector:
+    """Размер очереди фоновых задач и задержка самой старой готовой
+    задачи; считаются по таблице при каждом сборе метрик."""
+
+    def collect(self):
+        from jobs.models import Job
+
+        now = timezone.now()
+        try:
+            counts = dict(Job.objects.order_by().values_list('status')
+                          .annotate(total=Count('pk')))
+            oldest = Job.objects.filter(
+                status=Job.QUEUED, run_at__lte=now).aggregate(
+                oldest=Min('run_at'))['oldest']
+        except DatabaseError:
+            return
+        jobs = GaugeMetricFamily('yatube_jobs', 'Задачи в очереди',
+                                 labels=['status'])
+        for status, _ in Job.STATUSES:
+            jobs.add_metric([status], counts.get(status, 0))
+        yield jobs
+        yield GaugeMetricFamily(
+            'yatube_jobs_lag_seconds',
+            'Сколько ждёт самая старая готовая к выполнению задача',
+            value=(now - oldest).total_seconds() if oldest else 0)
+
+
+_queue_registry = CollectorRegistry()
+_queue_registry.register(JobQueueCollector())
+
+
+def metrics_view(request):
+    return HttpResponse(generate_latest(registry())
+                        + generate_latest(_queue_registry),
+                        content_type=CONTENT_TYPE_LATEST)
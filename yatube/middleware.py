@@ -0,0 +1,246 @@
+"""Замеры производительности каждого запроса.
+
+PerformanceMiddleware для каждого запроса считает:
+
+* число запросов к базе, время в базе и повторы одного и того же
+  запроса с теми же параметрами;
+* время рендеринга шаблонов (вместе с ленивыми запросами в них);
+* попадания и промахи кеша;
+* размер ответа.
+
+Эти замеры попадают в метрики Prometheus (yatube.metrics). Для доли
+запросов settings.PERFORMANCE_SAMPLE_RATE итог ещё пишется одной
+JSON-строкой в логгер yatube.performance, а в режиме DEBUG и для
+сотрудников — в заголовок Server-Timing, который показывают
+инструменты разработчика в браузере.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.backends.django import Template
+
+from . import metrics, routers
+
+logger = logging.getLogger('yatube.performance')
+
+_stats = ContextVar('performance_stats', default=None)
+_MISSING = object()
+
+
+class RequestStats:
+    def __init__(self):
+        # Запросы страницы могут идти параллельно из нескольких потоков
+        # (yatube.concurrency).
+        self.lock = threading.Lock()
+        self.queries = Counter()
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.render_depth = 0
+        self.cache_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.db_time += elapsed
+                self.queries[sql, repr(params)] += 1
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def duplicates(self):
+        """Сколько запросов повторили уже выполненный запрос."""
+        return sum(count - 1 for count in self.queries.values())
+
+    def top_duplicate(self):
+        (sql, _), count = self.queries.most_common(1)[0]
+        return sql[:200] if count > 1 else None
+
+
+def _timed_render(render):
+    def wrapper(self, *args, **kwargs):
+        stats = _stats.get()
+        if stats is None:
+            return render(self, *args, **kwargs)
+        stats.render_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            stats.render_depth -= 1
+            # Вложенные render (например, render_to_string внутри тега)
+            # уже входят во внешний.
+            if not stats.render_depth:
+                stats.render_time += time.perf_counter() - start
+    return wrapper
+
+
+def _counted_get(get):
+    def wrapper(self, key, default=None, *args, **kwargs):
+        stats = _stats.get()
+        if stats is None or stats.cache_depth:
+            return get(self, key, default, *args, **kwargs)
+        stats.cache_depth += 1
+        try:
+            value = get(self, key, _MISSING, *args, **kwargs)
+        finally:
+            stats.cache_depth -= 1
+        if value is _MISSING:
+            stats.cache_misses += 1
+            return default
+        stats.cache_hits += 1
+        return value
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    def wrapper(self, keys, *args, **kwargs):
+        stats = _stats.get()
+        if stats is None or stats.cache_depth:
+            return get_many(self, keys, *args, **kwargs)
+        keys = list(keys)
+        stats.cache_depth += 1
+        try:
+            values = get_many(self, keys, *args, **kwargs)
+        finally:
+            stats.cache_depth -= 1
+        stats.cache_hits += len(values)
+        stats.cache_misses += len(keys) - len(values)
+        return values
+    return wrapper
+
+
+def _patch(cls, name, decorator):
+    method = getattr(cls, name)
+    if not getattr(method, 'instrumented', False):
+        wrapper = decorator(method)
+        wrapper.instrumented = True
+        setattr(cls, name, wrapper)
+
+
+def install():
+    """Обернуть рендеринг шаблонов и чтение из используемых кешей.
+
+    Обёртки ничего не делают вне замеряемого запроса.
+    """
+    _patch(Template, 'render', _timed_render)
+    for alias in settings.CACHES:
+        cls = type(caches[alias])
+        _patch(cls, 'get', _counted_get)
+        _patch(cls, 'get_many', _counted_get_many)
+
+
+@contextmanager
+def instrument_connections():
+    """Считать запросы всех соединений текущего потока в замерах
+    текущего запроса, если они ведутся."""
+    stats = _stats.get()
+    with ExitStack() as stack:
+        if stats is not None:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(stats.execute))
+        yield
+
+
+class PerformanceMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install()
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _stats.set(stats)
+        metrics.REQUESTS_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            with instrument_connections():
+                response = self.get_response(request)
+        finally:
+            _stats.reset(token)
+            metrics.REQUESTS_IN_PROGRESS.dec()
+        total = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        size = None if response.streaming else len(response.content)
+        metrics.observe_request(view, request.method, stats, total, size)
+        if random.random() >= settings.PERFORMANCE_SAMPLE_RATE:
+            return response
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_ms': round(stats.db_time * 1000, 2),
+            'queries': stats.query_count,
+            'duplicate_queries': stats.duplicates,
+            'render_ms': round(stats.render_time * 1000, 2),
+            'cache_hits': stats.cache_hits,
+            'cache_misses': stats.cache_misses,
+            'bytes': size,
+        }
+        if stats.duplicates:
+            record['top_duplicate'] = stats.top_duplicate()
+        logger.info(json.dumps(record, ensure_ascii=False))
+
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={record["db_ms"]};desc="{stats.query_count} '
+                f'queries, {stats.duplicates} duplicate"',
+                f'render;dur={record["render_ms"]}',
+                f'cache;desc="{stats.cache_hits} hits, '
+                f'{stats.cache_misses} misses"',
+                f'total;dur={record["total_ms"]}',
+            ])
+        return response
+
+
+class PrimaryPinMiddleware:
+    """Читать из основной базы после записи.
+
+    Безопасные запросы без cookie settings.REPLICA_PIN_COOKIE читают с
+    реплик. Если запрос что-то записал, cookie ставится на
+    settings.REPLICA_PIN_SECONDS секунд — дольше допустимого отставания
+    реплик, — и следующие запросы пользователя читают из основной базы.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (request.method in ('GET', 'HEAD', 'OPTIONS')
+                and settings.REPLICA_PIN_COOKIE not in request.COOKIES):
+            tokens = routers.use_replicas()
+        else:
+            tokens = routers.use_primary()
+        try:
+            response = self.get_response(request)
+            wrote = routers.wrote()
+        finally:
+            routers.restore(tokens)
+        if wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(settings.REPLICA_PIN_COOKIE, '1',
+                                max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
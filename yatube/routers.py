@@ -0,0 +1,117 @@
+"""Чтение с реплик, запись в основную базу.
+
+ReplicaRouter отправляет запись в default, а чтение — на случайную
+реплику из settings.DATABASE_REPLICAS. Чтение идёт в основную базу,
+если:
+
+* запрос уже что-то записал — до его конца;
+* пользователь недавно что-то записал: PrimaryPinMiddleware ставит
+  cookie на settings.REPLICA_PIN_SECONDS, и пока она жива, пользователь
+  видит свои изменения, даже если реплика ещё не догнала основную базу;
+* код выполняется вне HTTP-запроса (команды, фоновые потоки);
+* все реплики отстают больше чем на settings.REPLICA_MAX_LAG секунд
+  или недоступны. Отставание проверяется не чаще раза в
+  settings.REPLICA_CHECK_INTERVAL секунд в каждом процессе.
+
+Таблица кеша (CACHE_BACKEND=db) всегда читается и пишется в основной
+базе, и запись в неё не закрепляет запрос за основной базой: иначе
+кеширование на анонимных GET ставило бы cookie закрепления, и такие
+ответы не попадали бы в микрокеш nginx.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+PRIMARY = 'default'
+
+# app_label модели, через которую DatabaseCache обращается к роутерам.
+CACHE_APP_LABEL = 'django_cache'
+
+# Вне запроса чтение идёт в основную базу; PrimaryPinMiddleware
+# разрешает реплики на время безопасного запроса.
+_use_primary = ContextVar('use_primary', default=True)
+_wrote = ContextVar('wrote', default=False)
+
+# Реплика -> (время проверки, пригодна ли она для чтения).
+_health = {}
+
+LAG_QUERY = {
+    'postgresql': (
+        'SELECT CASE WHEN pg_last_wal_receive_lsn() = '
+        'pg_last_wal_replay_lsn() THEN 0 ELSE COALESCE(EXTRACT(EPOCH '
+        'FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+    ),
+}
+
+
+def replica_lag(alias):
+    """Отставание реплики в секундах (0, если его не измерить)."""
+    connection = connections[alias]
+    query = LAG_QUERY.get(connection.vendor)
+    if query is None:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(query)
+        return float(cursor.fetchone()[0] or 0)
+
+
+def _is_healthy(alias):
+    now = time.monotonic()
+    checked_at, healthy = _health.get(alias, (None, False))
+    if (checked_at is None
+            or now - checked_at > settings.REPLICA_CHECK_INTERVAL):
+        try:
+            healthy = replica_lag(alias) <= settings.REPLICA_MAX_LAG
+        except DatabaseError:
+            healthy = False
+        _health[alias] = now, healthy
+    return healthy
+
+
+def use_replicas():
+    """Разрешить чтение с реплик в текущем контексте.
+
+    Возвращает токен для restore().
+    """
+    return _use_primary.set(False), _wrote.set(False)
+
+
+def use_primary():
+    return _use_primary.set(True), _wrote.set(False)
+
+
+def restore(tokens):
+    primary_token, wrote_token = tokens
+    _use_primary.reset(primary_token)
+    _wrote.reset(wrote_token)
+
+
+def wrote():
+    """Была ли запись в текущем контексте."""
+    return _wrote.get()
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if _use_primary.get() or model._meta.app_label == CACHE_APP_LABEL:
+            return PRIMARY
+        replicas = [alias for alias in settings.DATABASE_REPLICAS
+                    if _is_healthy(alias)]
+        return random.choice(replicas) if replicas else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == CACHE_APP_LABEL:
+            return PRIMARY
+        _use_primary.set(True)
+        _wrote.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
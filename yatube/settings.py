@@ -43,12 +43,14 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'sorl.thumbnail',
-    "debug_toolbar",
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
+    'yatube.middleware.PerformanceMiddleware',
+    'yatube.middleware.PrimaryPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,17 +58,28 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
 ]
 
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if not DEBUG:
+    # Шаблоны разбираются один раз на процесс, а не при каждом рендеринге.
+    TEMPLATE_LOADERS = [('django.template.loaders.cached.Loader',
+                         TEMPLATE_LOADERS)]
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -90,14 +103,90 @@ DATABASES = {
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD'),
         'HOST': os.environ.get('DB_HOST'),
         'PORT': os.environ.get('DB_PORT'),
+        # Соединение живёт DB_CONN_MAX_AGE секунд и переиспользуется
+        # следующими запросами воркера; перед повторным использованием
+        # оно проверяется (DB_CONN_HEALTH_CHECKS).
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.environ.get(
+            'DB_CONN_HEALTH_CHECKS', '1') == '1',
     }
 }
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Независимые запросы страницы (срез ленты и COUNT, проверка подписки,
+# комментарии) выполняются параллельно в пуле из QUERY_THREADS потоков,
+# у каждого своё соединение с базой.
+CONCURRENT_QUERIES = os.environ.get('CONCURRENT_QUERIES', '') == '1'
+QUERY_THREADS = int(os.environ.get('QUERY_THREADS', 8))
+
+# Проверка соединений и их метрики — в обёртке над бэкендом PostgreSQL.
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default']['ENGINE'] = 'yatube.db.backends.postgresql'
+
+# DB_POOLER=pgbouncer: соединения идут через PgBouncer в режиме пула
+# транзакций, где серверные курсоры между транзакциями не живут.
+if os.environ.get('DB_POOLER') == 'pgbouncer':
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Реплики для чтения: хосты через запятую в DB_REPLICA_HOSTS, остальные
+# параметры — как у основной базы. В тестах реплики отражают default.
+DATABASE_REPLICAS = []
+for number, host in enumerate(
+        filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    alias = f'replica{number}'
+    DATABASES[alias] = dict(DATABASES['default'], HOST=host.strip(),
+                            TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['yatube.routers.ReplicaRouter']
+
+# После записи пользователь читает из основной базы столько секунд;
+# реплики, отстающие больше REPLICA_MAX_LAG секунд, не используются.
+REPLICA_PIN_COOKIE = 'primary_pin'
+REPLICA_PIN_SECONDS = 10
+REPLICA_MAX_LAG = 5
+REPLICA_CHECK_INTERVAL = 5
+
+# Общий для всех воркеров кеш выбирается через CACHE_BACKEND:
+# redis — Redis или совместимый по протоколу сервер (CACHE_LOCATION —
+# redis://host:port/db), file — каталог на общем диске, db — таблица
+# в основной базе (python manage.py createcachetable). По умолчанию
+# locmem: у каждого процесса свой кеш, подходит только для разработки.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHE_LOCATION = os.environ.get('CACHE_LOCATION')
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': CACHE_LOCATION or 'redis://redis:6379/1',
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                'IGNORE_EXCEPTIONS': True,
+            },
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_LOCATION or os.path.join(BASE_DIR, 'cache'),
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+elif CACHE_BACKEND == 'db':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': CACHE_LOCATION or 'yatube_cache',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
-}
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -135,6 +224,13 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+# В собранном образе статические файлы получают хеш содержимого в имени
+# и заранее сжатые варианты. Без манифеста, который создаёт
+# collectstatic, {% static %} не работает, поэтому в разработке и
+# тестах хранилище обычное.
+if os.environ.get('STATIC_MANIFEST', '') == '1':
+    STATICFILES_STORAGE = (
+        'yatube.storage.CompressedManifestStaticFilesStorage')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -147,6 +243,96 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 SITE_ID = 1
 
+# Загрузки пишутся на диск по частям, попутно считается их sha256.
+FILE_UPLOAD_HANDLERS = ['posts.uploads.HashingUploadHandler']
+
+# Ограничения для изображений постов и размер, до которого уменьшается
+# сохраняемый оригинал.
+IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40 * 10 ** 6
+IMAGE_MASTER_SIZE = 2560
+IMAGE_MASTER_QUALITY = 88
+
+# Миниатюры изображений постов: ширины, пропорции карточки, качество
+# и каталог в MEDIA_ROOT. Строятся фоновой задачей после сохранения поста.
+THUMBNAIL_WIDTHS = (480, 960, 1440)
+THUMBNAIL_ASPECT = (960, 339)
+THUMBNAIL_QUALITY = 85
+THUMBNAIL_DIR = 'posts/thumbs/'
+
+# Фоновые задачи (приложение jobs). С JOBS_ASYNC=1 задачи записываются
+# в таблицу очереди и выполняются командой run_jobs в JOBS_CONCURRENCY
+# потоков, иначе — сразу в процессе, который их поставил. Задача,
+# которая выполняется дольше JOBS_LEASE_SECONDS, считается потерянной
+# (воркер остановился) и запускается снова. Между попытками упавшей
+# задачи выжидается JOBS_RETRY_DELAY секунд, с каждой попыткой вдвое
+# больше.
+JOBS_ASYNC = os.environ.get('JOBS_ASYNC', '') == '1'
+JOBS_CONCURRENCY = int(os.environ.get('JOBS_CONCURRENCY', 4))
+JOBS_POLL_INTERVAL = 1
+JOBS_LEASE_SECONDS = 300
+JOBS_RETRY_DELAY = 10
+JOBS_MAX_ATTEMPTS = 5
+
+# Готовые ленты подписок в кеше (fan-out on write). Посты авторов,
+# у которых подписчиков больше TIMELINE_FANOUT_LIMIT, подмешиваются
+# в ленту при чтении.
+FOLLOW_TIMELINES = os.environ.get('FOLLOW_TIMELINES', '') == '1'
+TIMELINE_LENGTH = 800
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_TTL = 60 * 60 * 24 * 7
+
+# Комментарии на странице поста подгружаются порциями по столько штук.
+COMMENTS_PER_PAGE = 20
+
+# Лента популярного (posts.popular): посты за последние
+# POPULAR_WINDOW_DAYS дней, не больше POPULAR_SIZE штук. Рейтинг растёт
+# на единицу с каждыми POPULAR_DECAY секундами свежести и с каждым
+# десятикратным ростом числа комментариев плюс подписчиков автора,
+# взятых с весом POPULAR_FOLLOWER_WEIGHT.
+POPULAR_WINDOW_DAYS = 7
+POPULAR_SIZE = 1000
+POPULAR_DECAY = 12 * 60 * 60
+POPULAR_FOLLOWER_WEIGHT = 0.1
+
+# Размер страницы JSON API по умолчанию и наибольший допустимый limit.
+API_PAGE_SIZE = 10
+API_MAX_PAGE_SIZE = 100
+
+# Конфигурация полнотекстового поиска PostgreSQL
+SEARCH_CONFIG = 'russian'
+
+# Режим постраничного вывода лент: 'pages' — номера страниц,
+# 'cursor' — курсоры по (pub_date, id) без COUNT и OFFSET.
+FEED_PAGINATION = os.environ.get('FEED_PAGINATION', 'pages')
+
+# Микрокеш nginx: сколько секунд хранить страницы для анонимных
+# посетителей (0 — не разрешать) и внутренний адрес nginx, через который
+# страницы обновляются после записи (пусто — не обновлять).
+EDGE_CACHE_SECONDS = int(os.environ.get('EDGE_CACHE_SECONDS', 10))
+EDGE_PURGE_URL = os.environ.get('EDGE_PURGE_URL', '')
+EDGE_PURGE_TIMEOUT = 5
+
+# Доля запросов, замеры которых PerformanceMiddleware пишет в логгер
+# yatube.performance (в метрики Prometheus попадают все запросы).
+PERFORMANCE_SAMPLE_RATE = float(
+    os.environ.get('PERFORMANCE_SAMPLE_RATE', 0.1))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'yatube.performance': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
@@ -0,0 +1,53 @@
+"""Хранилище статических файлов для сборки (collectstatic).
+
+ManifestStaticFilesStorage добавляет к имени каждого файла хеш его
+содержимого, поэтому nginx отдаёт такие файлы с бессрочным кешированием:
+изменённый файл получит новое имя. Для текстовых файлов рядом заранее
+кладутся сжатые варианты .gz и .br, и nginx не сжимает их на лету.
+Brotli используется, если установлен пакет brotli.
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.xml',
+                '.html', '.ico', '.ttf', '.eot')
+
+
+def compressed_variants(content):
+    """Заранее сжатые варианты: суффикс файла -> содержимое."""
+    variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content, quality=11)
+    return variants
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # Меньшие файлы после сжатия почти не уменьшаются.
+    min_size = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as file:
+            content = file.read()
+        if len(content) < self.min_size:
+            return
+        for suffix, data in compressed_variants(content).items():
+            if len(data) >= len(content):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(data))
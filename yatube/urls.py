@@ -4,20 +4,29 @@ from django.contrib.flatpages import views
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .edge import edge_cache
+from .metrics import metrics_view
+
+# Страницы flatpages nginx может отдавать анонимам из микрокеша.
+flatpage = edge_cache(views.flatpage)
+
 handler404 = "posts.views.page_not_found"  # noqa
 handler500 = "posts.views.server_error"  # noqa
 
 urlpatterns = [
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
-    path('about/', include('django.contrib.flatpages.urls')),
+    path('about/<path:url>', flatpage,
+         name='django.contrib.flatpages.views.flatpage'),
     path('admin/', admin.site.urls),
-    path('about-us/', views.flatpage, {'url': '/about-us/'},
+    path('metrics', metrics_view, name='metrics'),
+    path('api/v1/', include('posts.api', namespace='api_v1')),
+    path('about-us/', flatpage, {'url': '/about-us/'},
          name='about'),
-    path('terms/', views.flatpage, {'url': '/terms/'}, name='terms'),
-    path('about-author/', views.flatpage, {'url': '/about-author/'},
+    path('terms/', flatpage, {'url': '/terms/'}, name='terms'),
+    path('about-author/', flatpage, {'url': '/about-author/'},
          name='about-author'),
-    path('about-spec/', views.flatpage, {'url': '/about-spec/'},
+    path('about-spec/', flatpage, {'url': '/about-spec/'},
          name='about-spec'),
     path('', include('posts.urls')),
 ]